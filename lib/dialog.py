@@ -60,7 +60,7 @@ class TextDialog(GameState):
         self.border = GraphicBox("dialog2.png")
 
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
         if self.blank:
             self.blank = False
 
@@ -163,7 +163,7 @@ class ChoiceDialog(GameState):
     def deactivate(self):
         pass
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
         # fade in the dialog box background
         if self.state == 0:
             surface.blit(self.bkg, (10,160))
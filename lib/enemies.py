@@ -85,7 +85,7 @@ class LaserRobot(AvatarObject):
 
     def die(self):
         self.bolt = AvatarObject()
-        self.bolt.name = "self.bolt"
+        self.bolt.setName("self.bolt")
         avatar = Avatar()
         ani = Animation("electrify.png", "electrify", 2, 1, 50)
         avatar.add(ani)
@@ -108,7 +108,7 @@ class LaserRobot(AvatarObject):
 
 
     def shoot(self):
-        boss = [ i for i in self.parent.getChildren() if isinstance(i, Boss) ]
+        boss = self.parent.childrenOfType(Boss)
         hero = self.parent.getChildByGUID(1)
         bbox = self.parent.getBody(self).bbox.inflate(0,128,0)
 
@@ -180,7 +180,7 @@ class Boss(AvatarObject):
 
 
     def shoot(self):
-        robots = [ self.parent.getBody(i).bbox for i in self.parent.getChildren() if isinstance(i, LaserRobot) ]
+        robots = [ self.parent.getBody(i).bbox for i in self.parent.childrenOfType(LaserRobot) ]
         hero = self.parent.getChildByGUID(1)
         bbox = self.parent.getBody(self).bbox.inflate(0,320,0)
         if bbox.collidebbox(self.parent.getBody(hero).bbox):
@@ -67,6 +67,9 @@ SoundMan = SoundManager()
 hero_body = None
 state = None
 
+# set to a lib2d.playerinput.InputRecording to record the player's input
+recording = None
+
 
 class LevelState(GameState):
     """
@@ -94,6 +97,7 @@ class LevelState(GameState):
     def __init__(self, area, startPosition=None):
         GameState.__init__(self)
         self.area = area
+        self.ticks = 0          # number of updates, for recording input
         global state
         state = self
 
@@ -117,6 +121,7 @@ class LevelState(GameState):
         self.messages = []
 
         self.camera = None
+        self.previous = {}      # bboxes of bodies before the last update
 
         # allow the area to get needed data
         self.area.load()
@@ -194,7 +199,7 @@ class LevelState(GameState):
         surface.blit(i, (sw+ 10, sh+30))
 
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
         dirty = []
 
         x, y, z = self.player_vector
@@ -256,8 +261,9 @@ class LevelState(GameState):
 
 
         if not doFlash:
-            self.camera.center(self.area.getPosition(self.hero))
-            dirty.extend(self.camera.draw(surface))
+            bbox = self.camera.interpolate(self.hero, alpha, self.previous)
+            self.camera.center(bbox.origin)
+            dirty.extend(self.camera.draw(surface, alpha, self.previous))
             self.border.draw(surface, self.mapBorder)
 
         return dirty
@@ -270,6 +276,11 @@ class LevelState(GameState):
     def update(self, time):
         if self.blank: return
 
+        # bboxes are not mutable, so this is cheap
+        self.previous = dict((thing, body.bbox) for (thing, body)
+                             in self.area.bodies.iteritems())
+
+        self.ticks += 1
         self.area.update(time)
         self.camera.update(time)
 
@@ -287,6 +298,9 @@ class LevelState(GameState):
 
     # for platformers
     def handle_commandlist(self, cmdlist):
+        if recording is not None:
+            recording.record(self.ticks, cmdlist)
+
         if self.hero.isAlive:
             self.handleMovementKeys(cmdlist)
 
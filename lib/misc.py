@@ -179,7 +179,7 @@ class WakeTerminal(Terminal):
 
         else:
             self.activated = True
-            bots = [ i for i in self.parent.getChildren() if isinstance(i, LaserRobot) ]
+            bots = self.parent.childrenOfType(LaserRobot)
             for bot in bots:
                 bot.activate()
             area.emitText("Surprisingly, hitting your face against the keypad seemed to do something.", thing=self)
@@ -227,7 +227,7 @@ class DefuseTerminal(Terminal):
             self.activated = True
             if hero.hasPassword:
                 area.emitText(text['difused'], thing=self)
-                [ setattr(i, "isAlive", False) for i in self.parent.getChildren() if isinstance(i, Bomb) ]
+                [ setattr(i, "isAlive", False) for i in self.parent.childrenOfType(Bomb) ]
             else:
                 area.emitText("WHAT?  IT NEEDS A PASSWORD!?!", thing=self)
  
@@ -1,5 +1,6 @@
 from lib2d.tilemap import BufferedTilemapRenderer
 from lib2d.objects import AvatarObject
+from lib2d.bbox import BBox
 from pygame import Rect, draw
 
 import weakref
@@ -22,7 +23,8 @@ class LevelCamera(object):
         self.set_extent(rect)
 
         # create a renderer for the map
-        self.maprender = BufferedTilemapRenderer(tmxdata, rect)
+        self.maprender = BufferedTilemapRenderer(tmxdata, rect,
+                                    atlas=getattr(area, "atlas", None))
         self.map_width = tmxdata.tilewidth * tmxdata.width
         self.map_height = tmxdata.tileheight*tmxdata.height
         self.blank = True
@@ -107,7 +109,28 @@ class LevelCamera(object):
         raise NotImplementedError
 
 
-    def draw(self, surface):
+    def interpolate(self, thing, alpha=1.0, previous=None):
+        """
+        Return the bbox of a thing, between where it was before the last
+        update (previous is a dict of bboxes) and where it is now.
+        """
+
+        bbox = self.area.getBBox(thing)
+        if previous is None or alpha >= 1.0:
+            return bbox
+
+        try:
+            x0, y0, z0 = previous[thing].origin
+        except KeyError:
+            return bbox
+
+        x1, y1, z1 = bbox.origin
+        return BBox((x0 + (x1 - x0) * alpha,
+                     y0 + (y1 - y0) * alpha,
+                     z0 + (z1 - z0) * alpha), bbox.size)
+
+
+    def draw(self, surface, alpha=1.0, previous=None):
         avatarobjects = self.refreshAvatarObjects()
 
         onScreen = []
@@ -118,14 +141,16 @@ class LevelCamera(object):
 
         # quadtree collision testing would be good here
         for a in avatarobjects:
-            bbox = self.area.getBBox(a)
+            bbox = self.interpolate(a, alpha, previous)
             x, y, z, d, w, h = bbox
             x, y = self.toSurface((x, y, z))
             xx, yy = a.avatar.axis
             x += xx
             y += yy + h
             if self.extent.colliderect((x, y, w, h)):
-                onScreen.append((a.avatar.image, Rect(self.toScreen((x, y)), (w, h)), 1, a, bbox))
+                image, area = a.avatar.frame
+                rect = Rect(self.toScreen((x, y)), (w, h))
+                onScreen.append((image, rect, 1, area, a, bbox))
 
         # should not be sorted every frame
         onScreen.sort(key=screenSorter)
@@ -141,7 +166,7 @@ class LevelCamera(object):
             draw.rect(surface, (128,128,255), \
             (self.toScreen(self.toSurface((0, x, y))), (w, h)), 1)
 
-        for i, r, l, a in onScreen:
+        for i, r, l, area, a, bbox in onScreen:
             x, y, z, d, w, h, = self.area.getBBox(a)
             x, y = self.toScreen(self.toSurface((x, y, z+h)))
             draw.rect(surface, (255,128,128), (x, y, w, h), 1)
@@ -38,7 +38,7 @@ class InstructionScreen(GameState):
         self.activated = True
         self.redraw = True
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
         if self.redraw:
             sw, sh = surface.get_size()
             self.redraw = False
@@ -97,7 +97,7 @@ class TitleScreen(GameState):
         self.menu.handle_event(event)
 
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
         if self.redraw:
             self.redraw = False
             if self.game:
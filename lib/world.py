@@ -25,7 +25,7 @@ def build():
 
     # build the initial environment
     uni = Area()
-    uni.name = 'universe'
+    uni.setName("universe")
     uni.setGUID(0)
 
 
@@ -0,0 +1,464 @@
+"""
+Dynamic AABB tree for collision detection between things that move.
+
+The quadtrees in quadtree.py have to be built again whenever an item moves.
+This tree can have items inserted, removed and moved one at a time, and it
+stays balanced as they are.
+
+Each leaf is stored with a "fat" rect, a little larger than the item.  An
+item can move inside its fat rect without changing the tree at all, which
+is what usually happens from one frame to the next.
+
+Nodes are kept in flat lists indexed by node id, rather than as objects.
+Queries return the ids of the leaves that are hit; use item(id) to get the
+item that was inserted.
+
+Based on the dynamic tree from Box2D.
+"""
+
+from bbox import intersect
+
+
+NULL = -1
+
+
+
+class AABBTree(object):
+    """
+    Stores items by rect (left, top, width, height).
+
+    Rects that touch at an edge are counted as overlapping, as in QuadTree.
+    """
+
+    def __init__(self, margin=4):
+        self.margin = margin    # fat rects are this much larger on each side
+        self.root = NULL
+
+        # bounds of nodes.  for leaves this is the fat rect
+        self.x1 = []
+        self.y1 = []
+        self.x2 = []
+        self.y2 = []
+
+        self.child1 = []        # NULL for leaves
+        self.child2 = []
+        self.parent = []
+        self.height = []        # leaves are 0, free nodes are -1
+
+        # only used by leaves
+        self.items = []
+        self.tight = []         # real rect of the item as (x1, y1, x2, y2)
+
+        self.leaves = {}        # item -> leaf id
+        self._free = []
+
+
+    def __len__(self):
+        return len(self.leaves)
+
+
+    def __contains__(self, item):
+        return item in self.leaves
+
+
+    def item(self, leaf):
+        return self.items[leaf]
+
+
+    def insert(self, item, rect):
+        """
+        add an item to the tree and return the id of its leaf
+        """
+
+        if item in self.leaves:
+            msg = "Item {} is already in the tree"
+            raise ValueError, msg.format(item)
+
+        x, y, w, h = rect
+        m = self.margin
+        leaf = self._allocate()
+        self.x1[leaf] = x - m
+        self.y1[leaf] = y - m
+        self.x2[leaf] = x + w + m
+        self.y2[leaf] = y + h + m
+        self.height[leaf] = 0
+        self.items[leaf] = item
+        self.tight[leaf] = (x, y, x + w, y + h)
+
+        self.leaves[item] = leaf
+        self._insertLeaf(leaf)
+        return leaf
+
+
+    def remove(self, item):
+        try:
+            leaf = self.leaves.pop(item)
+        except KeyError:
+            msg = "Item {} is not in the tree"
+            raise ValueError, msg.format(item)
+
+        self._removeLeaf(leaf)
+        self.items[leaf] = None
+        self.tight[leaf] = None
+        self._release(leaf)
+
+
+    def update(self, item, rect):
+        """
+        call when an item has moved.
+
+        returns True if the tree had to be changed, or False if the item is
+        still inside of its fat rect.
+        """
+
+        leaf = self.leaves[item]
+        x, y, w, h = rect
+        x2 = x + w
+        y2 = y + h
+        self.tight[leaf] = (x, y, x2, y2)
+
+        if (x >= self.x1[leaf] and y >= self.y1[leaf] and
+            x2 <= self.x2[leaf] and y2 <= self.y2[leaf]):
+            return False
+
+        self._removeLeaf(leaf)
+        m = self.margin
+        self.x1[leaf] = x - m
+        self.y1[leaf] = y - m
+        self.x2[leaf] = x2 + m
+        self.y2[leaf] = y2 + m
+        self._insertLeaf(leaf)
+        return True
+
+
+    def query(self, rect):
+        """
+        return a list of the leaf ids of items that overlap the rect
+        """
+
+        if self.root == NULL:
+            return []
+
+        x, y, w, h = rect
+        x2 = x + w
+        y2 = y + h
+
+        X1, Y1, X2, Y2 = self.x1, self.y1, self.x2, self.y2
+        child1, child2, tight = self.child1, self.child2, self.tight
+
+        hits = []
+        stack = [self.root]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node = pop()
+            if x > X2[node] or X1[node] > x2 or y > Y2[node] or Y1[node] > y2:
+                continue
+
+            if child1[node] == NULL:
+                tx1, ty1, tx2, ty2 = tight[node]
+                if not (x > tx2 or tx1 > x2 or y > ty2 or ty1 > y2):
+                    hits.append(node)
+            else:
+                push(child1[node])
+                push(child2[node])
+
+        return hits
+
+
+    def hit(self, rect):
+        """
+        return a list of the items that overlap the rect
+        """
+
+        items = self.items
+        return [ items[i] for i in self.query(rect) ]
+
+
+    def _allocate(self):
+        if self._free:
+            node = self._free.pop()
+        else:
+            node = len(self.x1)
+            for l in (self.x1, self.y1, self.x2, self.y2):
+                l.append(0)
+            for l in (self.child1, self.child2, self.parent, self.height):
+                l.append(NULL)
+            self.items.append(None)
+            self.tight.append(None)
+
+        self.child1[node] = NULL
+        self.child2[node] = NULL
+        self.parent[node] = NULL
+        self.height[node] = 0
+        return node
+
+
+    def _release(self, node):
+        self.height[node] = NULL
+        self._free.append(node)
+
+
+    def _fit(self, node, a, b):
+        """
+        set the bounds of node to the union of nodes a and b
+        """
+
+        self.x1[node] = min(self.x1[a], self.x1[b])
+        self.y1[node] = min(self.y1[a], self.y1[b])
+        self.x2[node] = max(self.x2[a], self.x2[b])
+        self.y2[node] = max(self.y2[a], self.y2[b])
+
+
+    def _costs(self, leaf):
+        """
+        return the function _insertLeaf uses to find the best sibling for a
+        leaf.  for a node it returns the perimeter of the node joined with
+        the leaf, and how much larger that is than the node's own perimeter.
+        trees with more axis override this along with _fit.
+        """
+
+        X1, Y1, X2, Y2 = self.x1, self.y1, self.x2, self.y2
+        lx1, ly1, lx2, ly2 = X1[leaf], Y1[leaf], X2[leaf], Y2[leaf]
+
+        def cost(node):
+            x1, y1, x2, y2 = X1[node], Y1[node], X2[node], Y2[node]
+            union = (max(x2, lx2) - min(x1, lx1) +
+                     max(y2, ly2) - min(y1, ly1))
+            return union, union - (x2 - x1 + y2 - y1)
+
+        return cost
+
+
+    def _insertLeaf(self, leaf):
+        if self.root == NULL:
+            self.root = leaf
+            self.parent[leaf] = NULL
+            return
+
+        child1, child2 = self.child1, self.child2
+        combined = self._costs(leaf)
+
+        # find the best sibling for the leaf by the increase in perimeter
+        node = self.root
+        while child1[node] != NULL:
+            union, growth = combined(node)
+
+            # cost of making a new parent for this node and the leaf
+            cost = 2 * union
+
+            # cost of pushing the leaf further down the tree
+            inherited = 2 * growth
+
+            costs = []
+            for child in (child1[node], child2[node]):
+                union, growth = combined(child)
+                if child1[child] != NULL:
+                    costs.append(growth + inherited)
+                else:
+                    costs.append(union + inherited)
+
+            if cost < costs[0] and cost < costs[1]:
+                break
+
+            if costs[0] < costs[1]:
+                node = child1[node]
+            else:
+                node = child2[node]
+
+        # make a new parent for the sibling and the leaf
+        sibling = node
+        oldParent = self.parent[sibling]
+        newParent = self._allocate()
+        self.parent[newParent] = oldParent
+        self._fit(newParent, leaf, sibling)
+        self.height[newParent] = self.height[sibling] + 1
+
+        if oldParent == NULL:
+            self.root = newParent
+        elif child1[oldParent] == sibling:
+            child1[oldParent] = newParent
+        else:
+            child2[oldParent] = newParent
+
+        child1[newParent] = sibling
+        child2[newParent] = leaf
+        self.parent[sibling] = newParent
+        self.parent[leaf] = newParent
+
+        self._refit(self.parent[leaf])
+
+
+    def _removeLeaf(self, leaf):
+        if leaf == self.root:
+            self.root = NULL
+            return
+
+        parent = self.parent[leaf]
+        grandParent = self.parent[parent]
+        if self.child1[parent] == leaf:
+            sibling = self.child2[parent]
+        else:
+            sibling = self.child1[parent]
+
+        if grandParent == NULL:
+            self.root = sibling
+            self.parent[sibling] = NULL
+            self._release(parent)
+            return
+
+        if self.child1[grandParent] == parent:
+            self.child1[grandParent] = sibling
+        else:
+            self.child2[grandParent] = sibling
+        self.parent[sibling] = grandParent
+        self._release(parent)
+
+        self._refit(grandParent)
+
+
+    def _refit(self, node):
+        """
+        walk up the tree from a node, fixing bounds and heights
+        """
+
+        height = self.height
+        while node != NULL:
+            node = self._balance(node)
+            a = self.child1[node]
+            b = self.child2[node]
+            height[node] = 1 + max(height[a], height[b])
+            self._fit(node, a, b)
+            node = self.parent[node]
+
+
+    def _balance(self, a):
+        """
+        rotate a subtree if one side is taller than the other.
+        returns the node that is now at the top of the subtree.
+        """
+
+        height = self.height
+        child1, child2, parent = self.child1, self.child2, self.parent
+
+        if child1[a] == NULL or height[a] < 2:
+            return a
+
+        b = child1[a]
+        c = child2[a]
+        balance = height[c] - height[b]
+
+        if -1 <= balance <= 1:
+            return a
+
+        # the taller child is rotated up to take the place of a
+        if balance > 1:
+            up, other = c, b
+        else:
+            up, other = b, c
+
+        f = child1[up]
+        g = child2[up]
+
+        child1[up] = a
+        parent[up] = parent[a]
+        parent[a] = up
+
+        p = parent[up]
+        if p == NULL:
+            self.root = up
+        elif child1[p] == a:
+            child1[p] = up
+        else:
+            child2[p] = up
+
+        # the taller grandchild stays with the node that moved up
+        if height[f] > height[g]:
+            keep, give = f, g
+        else:
+            keep, give = g, f
+
+        child2[up] = keep
+        if up == c:
+            child2[a] = give
+        else:
+            child1[a] = give
+        parent[give] = a
+
+        self._fit(a, other, give)
+        self._fit(up, a, keep)
+        height[a] = 1 + max(height[other], height[give])
+        height[up] = 1 + max(height[a], height[keep])
+
+        return up
+
+
+
+class AABBTreeBroadphase(object):
+    """
+    Broadphase for bodies in an Area, using an AABBTree.
+
+    Has the same interface as SpatialHash, so either can be used by an Area.
+    Like SpatialHash, only the y and z axis are stored in the tree.
+    """
+
+    def __init__(self, margin=4):
+        self.tree = AABBTree(margin)
+        self.touched = None     # if a set, bodies added or moved are put here
+
+
+    def __len__(self):
+        return len(self.tree)
+
+
+    def __contains__(self, body):
+        return body in self.tree
+
+
+    @staticmethod
+    def toRect(bbox):
+        return bbox.left, bbox.bottom, bbox.width, bbox.height
+
+
+    def add(self, body):
+        if self.touched is not None:
+            self.touched.add(body)
+
+        self.tree.insert(body, self.toRect(body.bbox))
+
+
+    def remove(self, body):
+        try:
+            self.tree.remove(body)
+        except ValueError:
+            pass
+
+
+    def update(self, body):
+        """
+        call when the bbox of a body has changed
+        """
+
+        if body not in self.tree:
+            return
+
+        if self.touched is not None:
+            self.touched.add(body)
+
+        self.tree.update(body, self.toRect(body.bbox))
+
+
+    def candidates(self, bbox):
+        """
+        return a set of the bodies that may collide with the bbox.
+        """
+
+        return set(self.tree.hit(self.toRect(bbox)))
+
+
+    def hit(self, bbox):
+        """
+        return a list of bodies that collide with the bbox
+        """
+
+        return [ body for body in self.tree.hit(self.toRect(bbox))
+                 if intersect(bbox, body.bbox) ]
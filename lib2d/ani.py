@@ -74,7 +74,7 @@ class Animation(GameObject):
         self.size = size
 
         if name == None:
-            self.name = filename
+            self.setName(filename)
 
         self.directions = directions  # number of directions for animation
         self.frames = ([],) * directions
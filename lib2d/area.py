@@ -2,12 +2,23 @@ import res
 from objects import GameObject
 from quadtree import QuadTree, FrozenRect
 from pygame import Rect
-from bbox import BBox
+from bbox import BBox, intersect, intersectRay, intersectSphere
+from spatialhash import SpatialHash
+from aabbtree import AABBTreeBroadphase
+from bboxtree import BBoxTreeBroadphase
+from atlas import Atlas
 from pathfinding import astar
 from lib2d.signals import *
 from vec import Vec2d
+from itertools import izip
+from operator import itemgetter
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 cardinalDirs = {"north": math.pi*1.5, "east": 0.0, "south": math.pi/2, "west": math.pi}
 
 
@@ -32,6 +43,9 @@ class ExitTile(FrozenRect):
 class Body(object):
     def __init__(self, bbox, acc, vel, o, parent=None):
         self.parent = parent
+        self.broadphase = None  # set by the area this body is in
+        self.arrays = None      # BodyArrays of the area, for batched physics
+        self.row = None         # row of this body in arrays
         self.bbox = bbox
         self.oldbbox = bbox
         self.acc = acc
@@ -45,6 +59,19 @@ class Body(object):
         else:
             return "<Body: {}>".format(self.parent)
 
+    @property
+    def bbox(self):
+        return self._bbox
+
+
+    @bbox.setter
+    def bbox(self, bbox):
+        # keep the area's broadphase in sync, however the bbox is changed
+        self._bbox = bbox
+        if self.broadphase is not None:
+            self.broadphase.update(self)
+
+
     @property
     def gravity(self):
         return self.parent.gravity
@@ -72,6 +99,128 @@ class Body(object):
             pass
 
 
+class ArrayBody(Body):
+    """
+    Body that is in a BodyArrays.  acc, vel and bbox are kept in the body's
+    row of the arrays.  bodies are only made into ArrayBodies by BodyArrays,
+    so bodies that are not batched keep plain attributes.
+    """
+
+    @property
+    def bbox(self):
+        return self._bbox
+
+
+    @bbox.setter
+    def bbox(self, bbox):
+        Body.bbox.fset(self, bbox)
+        self.arrays.bbox[self.row] = tuple(bbox)
+
+
+    @property
+    def acc(self):
+        return RowVec(self, "acc")
+
+
+    @acc.setter
+    def acc(self, acc):
+        self.arrays.acc[self.row] = tuple(acc)
+
+
+    @property
+    def vel(self):
+        return RowVec(self, "vel")
+
+
+    @vel.setter
+    def vel(self, vel):
+        self.arrays.vel[self.row] = tuple(vel)
+
+
+class RowVec(Vec2d):
+    """
+    acc or vel of a body that is in a BodyArrays.  the values are kept in
+    the body's row of the arrays, so changing them in place works like it
+    does with a Vec2d.
+    """
+
+    __slots__ = ['body', 'name']
+
+    def __init__(self, body, name):
+        self.body = body
+        self.name = name
+
+
+    def _get(self, i):
+        body = self.body
+        return getattr(body.arrays, self.name).item(body.row, i)
+
+
+    def _set(self, i, value):
+        body = self.body
+        getattr(body.arrays, self.name)[body.row, i] = value
+
+
+    x = property(lambda self: self._get(0), lambda self, v: self._set(0, v))
+    y = property(lambda self: self._get(1), lambda self, v: self._set(1, v))
+
+
+class BodyArrays(object):
+    """
+    acc, vel and bbox of the bodies of an area, in numpy arrays with a row
+    for each body, so batched physics can work on all of them at once.
+
+    while a body is in the arrays it is an ArrayBody, so its acc, vel and
+    bbox are read from and written to its row.  rows are kept packed: when a body is removed, the
+    last body is moved into its row.
+    """
+
+    def __init__(self, size=64):
+        self.bodies = []                    # body in each row
+        self.acc = numpy.zeros((size, 2))
+        self.vel = numpy.zeros((size, 2))
+        self.bbox = numpy.zeros((size, 6))
+
+
+    def __len__(self):
+        return len(self.bodies)
+
+
+    def add(self, body):
+        acc, vel = body.acc, body.vel
+        row = len(self.bodies)
+        if row == len(self.acc):
+            grow = lambda a: numpy.concatenate((a, numpy.zeros_like(a)))
+            self.acc, self.vel, self.bbox = map(grow, (self.acc, self.vel,
+                                                       self.bbox))
+
+        self.bodies.append(body)
+        body.arrays = self
+        body.row = row
+        body.__class__ = ArrayBody
+        body.acc = acc
+        body.vel = vel
+        self.bbox[row] = tuple(body.bbox)
+
+
+    def remove(self, body):
+        acc, vel = Vec2d(body.acc), Vec2d(body.vel)
+        row = body.row
+        last = self.bodies.pop()
+        if last is not body:
+            self.bodies[row] = last
+            self.acc[row] = self.acc[last.row]
+            self.vel[row] = self.vel[last.row]
+            self.bbox[row] = self.bbox[last.row]
+            last.row = row
+
+        body.__class__ = Body
+        body.arrays = None
+        body.row = None
+        body.acc = acc
+        body.vel = vel
+
+
 class AbstractArea(GameObject):
     pass
 
@@ -104,6 +253,8 @@ class Area(AbstractArea):
     Includes basic pathfinding, collision detection, among other things.
 
     uses a quadtree for fast collision testing with level geometry.
+    bodies are kept in a spatial hash, so collision tests between bodies
+    only need to consider the bodies that are nearby.
 
     bodies can exits in layers, just like maps.  since the y values can
     vary, when testing for collisions the y value will be truncated and tested
@@ -144,6 +295,25 @@ class Area(AbstractArea):
     """
 
 
+    # integrate physics for all bodies at once with numpy.  results are the
+    # same as updatePhysics, but scale much better in crowded areas.  when
+    # fewer than batchMinBodies bodies are moving the swept tests cost more
+    # than they save, so every body goes through the collision tests.
+    batchPhysics = False
+    batchMinBodies = 12
+
+    # game time of one update that the physics was tuned for (see the
+    # statedriver).  landing speeds are scaled to it before testing for fall
+    # damage and bouncing, so those do not depend on the length of an update.
+    physicsTime = 3.0
+
+    # broadphase for collisions between bodies.  SpatialHash works best when
+    # bodies are about the same size; AABBTreeBroadphase when sizes vary a lot
+    # or bodies are spread over a very large area.  BBoxTreeBroadphase also
+    # tests depth, and can answer ray and radius queries without a scan.
+    broadphaseType = SpatialHash
+
+
     def defaultPosition(self):
         return BBox(0,0,0,1,1,1)
 
@@ -156,12 +326,16 @@ class Area(AbstractArea):
         AbstractArea.__init__(self)
         self.exits    = {}
         self.geometry = {}       # geometry (for collisions) of each layer
+        self._geometryArrays = {} # same as geometry, for batched physics
+        self._bodyArrays = None  # BodyArrays, made by updateBatched
         self.bodies = {}         # hack
+        self.broadphase = self.broadphaseType()  # collisions between bodies
         self.extent = None       # absolute boundries of the area
         self.joins = []          # records simple joins between bodies
         self.messages = []
         self.time = 0
         self.tmxdata = None
+        self.atlas = None        # images of the map and avatars, see load
         self.mappath = None
         self.sounds = []
         self.soundFiles = []
@@ -172,6 +346,7 @@ class Area(AbstractArea):
         self.drawables = []      # HAAAAKCCCCKCK
         self.changedAvatars = True #hack
         self._grounded = {}
+        self._speedScale = 1.0   # see physicsTime
         self.music_pos = 0
 
         self.flashes = []
@@ -192,7 +367,11 @@ class Area(AbstractArea):
         from pytmx import tmxloader
  
         self.tmxdata = tmxloader.load_pygame(
-                       self.mappath, force_colorkey=(128,128,0))
+                       self.mappath, force_colorkey=(128,128,0), cache=True,
+                       merge_layers=True, lazy_images=True)
+
+        # tiles and frames of animations are packed into a few surfaces
+        self.atlas = Atlas()
 
         # quadtree for handling collisions with exit tiles
         rects = []
@@ -226,7 +405,20 @@ class Area(AbstractArea):
 
         body = Body(BBox(pos, thing.size), Vec2d(0,0), Vec2d(0,0), 0.0, \
                     parent=thing)
+        try:
+            old = self.bodies[thing]
+        except KeyError:
+            pass
+        else:
+            self.broadphase.remove(old)
+            if old.arrays is not None:
+                old.arrays.remove(old)
+
         self.bodies[thing] = body
+        body.broadphase = self.broadphase
+        self.broadphase.add(body)
+        if self._bodyArrays is not None:
+            self._bodyArrays.add(body)
         AbstractArea.add(self, thing)
         #AbstractArea.add(self, body)
         self.changedAvatars = True
@@ -238,7 +430,11 @@ class Area(AbstractArea):
             return
 
         AbstractArea.remove(self, thing)
-        del self.bodies[thing]
+        body = self.bodies.pop(thing)
+        self.broadphase.remove(body)
+        body.broadphase = None
+        if body.arrays is not None:
+            body.arrays.remove(body)
         self.changedAvatars = True
 
         # hack
@@ -262,72 +458,122 @@ class Area(AbstractArea):
             caller: part of callback for object that created request to move
 
         Returns:
-            None
-
-        Raises:
-            CollisionError  
+            True if the body was moved, False if it was blocked
 
 
-        You should catch the exception if body cannot move.
+        Bodies that are pushed or joined to the body are moved with it, or
+        nothing is moved at all.
         This function will emit a bodyRelMove event if successful. 
         """
 
         if not isinstance(body, Body):
             raise ValueError, "must supply a body"
 
-        movable = 0
-        originalbbox = body.bbox
-        newbbox = originalbbox.move(x, y, z)
+        group = self._pushGroup(body, (x, y, z), push, clip)
+        if group is None:
+            return False
+
+        # commit the move for the whole group before sending any events
+        moved = []
+        for other in group:
+            originalbbox = other.bbox
+            newbbox = originalbbox.move(x, y, z)
+            other.oldbbox = originalbbox
+            other.bbox = newbbox
+            moved.append((other, originalbbox, newbbox))
+
+        # pushed bodies first, like when pushing was recursive
+        for other, originalbbox, newbbox in reversed(moved[1:]):
+            self._afterMove(other, originalbbox, newbbox)
+
+        other, originalbbox, newbbox = moved[0]
+        return self._afterMove(body, originalbbox, newbbox, caller=caller,
+                               suppress_warp=suppress_warp)
+
+
+    def _pushGroup(self, body, (x, y, z), push=True, clip=True):
+        """
+        Return a list of bodies that will move if body is moved, or None if
+        the move is blocked.  The first item will be body.
+
+        The group is found with a breadth-first search, so long chains of
+        pushed or joined bodies do not recurse, and each body is only visited
+        once, even if bodies are joined in a loop.
+        """
+
+        newbbox = body.bbox.move(x, y, z)
 
         # collides with level geometry, cannot move
-        if self.testCollideGeometry(newbbox) and clip:
-            return False
+        if clip and self.testCollideGeometry(newbbox):
+            return None
 
-        # test for collisions with other bodies
-        collide = self.testCollideObjects(newbbox)
-        try:
-            collide.remove(body)
-        except:
-            pass
+        joins = {}
+        for body0, body1 in self.joins:
+            joins.setdefault(body0, []).append(body1)
 
-        # find things we are joined to
-        joins = [ i[1] for i in self.joins if i[0] == body ]
+        group = [body]
+        visited = set(group)
+
+        # test for collisions with other bodies
+        collide = self.testCollideObjects(newbbox, skip=group)
 
         # if joined, then add it to collisions and treat it is if being pushed
-        if joins:
-            collide.extend(b for b in joins if not b == body)
+        joined = [ b for b in joins.get(body, []) if not b == body ]
+        if joined:
+            collide.extend(joined)
             push = True
 
-        # handle collisions with bodies
-        if collide:
+        if not collide:
+            return group
 
-            # are we pushing something?
-            if push and all([ other.pushable for other in collide ]):
+        # are we pushing something?
+        if not (push and all(other.pushable for other in collide)):
+            if clip:
+                return None
+            else:
+                return group
+
+        # find everything that will be pushed along
+        i = 0
+        while 1:
+            for other in collide:
+                if not other in visited:
+                    visited.add(other)
+                    group.append(other)
+
+            i += 1
+            if i == len(group):
+                break
+
+            other = group[i]
+            collide = self.testCollideObjects(other.bbox.move(x, y, z),
+                                              skip=visited)
+            collide.extend(b for b in joins.get(other, [])
+                           if not b in visited)
+
+            if not all(b.pushable for b in collide):
+                return None
 
-                # we are able to move
-                body.oldbbox = body.bbox
-                body.bbox = newbbox
+        # pushed bodies cannot move through level geometry
+        if self.testCollideGeometryMany([ other.bbox.move(x, y, z)
+                                          for other in group[1:] ]):
+            return None
 
-                # recursively push other bodies
-                for other in collide:
-                    if not self.movePosition(other, (x, y, z), push=True):
-                        # we collided, so just go back to old position
-                        body.oldbbox = originalbbox
-                        body.bbox = originalbbox
-                        return False
+        return group
 
-            else:
-                if clip: return False
 
-        body.oldbbox = body.bbox
-        body.bbox = newbbox
+    def _afterMove(self, body, originalbbox, newbbox, caller=None, \
+                   suppress_warp=False):
+        """
+        handle signals, sounds and exits for a body that has just moved
+        """
 
         self._sendBodyMove(body, caller=caller)
 
         bbox2 = newbbox.move(0,0,32)
-        tilePos = self.worldToTile(bbox2.topcenter)
         try:
             # emit sounds from bodies walking on them
+            tilePos = self.worldToTile(bbox2.topcenter)
             prop = self.tmxdata.getTileProperties(tilePos)
         except:
             pass
@@ -426,6 +672,11 @@ class Area(AbstractArea):
         self.geometry[layer] = quadtree.FastQuadTree(rects)
         self.geoRect = rects
 
+        if numpy is not None:
+            self._geometryArrays[layer] = numpy.array(
+                [ (r.left, r.top, r.right, r.bottom) for r in rects ],
+                dtype=float).reshape(len(rects), 4)
+
 
     def pathfind(self, obj, destination):
         """Pathfinding for the world.  Destinations are 'snapped' to tiles.
@@ -496,9 +747,15 @@ class Area(AbstractArea):
 
         [ sound.update(time) for sound in self.sounds ]
 
-        for thing, body in self.bodies.items():
-            self.updatePhysics(body, time)
-            thing.update(time)
+        if time:
+            self._speedScale = self.physicsTime / time
+
+        if self.batchPhysics and numpy is not None:
+            self.updateBatched(time)
+        else:
+            for thing, body in self.bodies.items():
+                self.updatePhysics(body, time)
+                thing.update(time)
 
         # awkward looping allowing objects to be added/removed during update
         self.inUpdate = False
@@ -508,6 +765,208 @@ class Area(AbstractArea):
         self._removeQueue = []
 
 
+    def updateBatched(self, time):
+        """
+        update all the bodies, integrating their physics in one numpy step
+
+        acc, vel and bbox of the bodies are kept in a BodyArrays.  bodies
+        that are in the open (their swept bbox for this update does not touch
+        level geometry, other bodies, or joins) are moved by their velocity
+        without the collision tests in movePosition.  only the other bodies
+        go through _resolvePhysics, so the results are the same as
+        updatePhysics.
+        """
+
+        items = self.bodies.items()
+        if not items:
+            return
+
+        arrays = self._bodyArrays
+        if arrays is None:
+            arrays = BodyArrays()
+            for body in self.bodies.itervalues():
+                arrays.add(body)
+            self._bodyArrays = arrays
+
+        n = len(arrays)
+        dt = time / 100
+
+        # the same math as updatePhysics.  gravity is an attribute of the
+        # things, and may change at any time, so it is read for each update.
+        acc = arrays.acc[:n]
+        vel = arrays.vel[:n]
+        gravity = numpy.fromiter((b.gravity for b in arrays.bodies), bool, n)
+        acc[gravity] += (0 * dt, 9.8 * dt)
+        numpy.multiply(acc, dt, out=vel)
+
+        # rows are looked up first, in case bodies are added while updating.
+        # bodies that are not moving have nothing to resolve.
+        rows = [ body.row for thing, body in items ]
+        moving = vel.any(axis=1)
+
+        if moving.sum() < self.batchMinBodies:
+            moving = moving.tolist()
+            for (thing, body), row in izip(items, rows):
+                if moving[row]:
+                    self._resolvePhysics(body, self.movePosition)
+                thing.update(time)
+            return
+
+        # swept bboxes: the space each body could move through.  bodies that
+        # are not moving are still obstacles for the others.
+        boxes = arrays.bbox[:n]
+        vy, vz = vel.T
+        x, y, z, d, w, h = boxes.T
+        lo = numpy.column_stack((x, y + numpy.minimum(vy, 0),
+                                    z + numpy.minimum(vz, 0)))
+        hi = numpy.column_stack((x + d, y + w + numpy.maximum(vy, 0),
+                                        z + h + numpy.maximum(vz, 0)))
+
+        # each test is only done if some bodies are still in the open
+        free = moving & ~self._sweptGeometry(lo, hi, h)
+        if free.any():
+            free &= ~self._sweptCrowded(lo, hi)
+        for body, other in self.joins:
+            if body.arrays is arrays:
+                free[body.row] = False
+
+        moving = moving.tolist()
+        free = free.tolist()
+        lo = lo.tolist()
+        hi = hi.tolist()
+        boxes = boxes.tolist()
+        vel = vel.tolist()
+
+        # bodies moved by other bodies or objects during the update cannot
+        # use the classification above, so they are tracked here.  a body
+        # that was only moved by its own velocity stays in its swept bbox,
+        # where no body in the open can reach it, so it is not tracked.
+        touched = set()
+        hit = self.broadphase.hit
+        self.broadphase.touched = touched
+        try:
+            for (thing, body), row in izip(items, rows):
+                isFree = free[row]
+                if isFree and touched:
+                    if body in touched:
+                        isFree = False
+                    else:
+                        (x0, y0, z0), (x1, y1, z1) = lo[row], hi[row]
+                        swept = BBox(x0, y0, z0, x1 - x0, y1 - y0, z1 - z0)
+                        isFree = touched.isdisjoint(hit(swept))
+
+                if isFree:
+                    self._moveFree(body, vel[row])
+                elif moving[row]:
+                    self._resolvePhysics(body, self.movePosition)
+
+                if touched:
+                    x, y, z, d, w, h = boxes[row]
+                    vy, vz = vel[row]
+                    x1, y1, z1, d1, w1, h1 = body.bbox
+                    if (x1 == x and (d1, w1, h1) == (d, w, h) and
+                        (y1 == y or y1 == y + vy) and
+                        (z1 == z or z1 == z + vz)):
+                        touched.discard(body)
+
+                thing.update(time)
+        finally:
+            self.broadphase.touched = None
+
+
+    def _moveFree(self, body, (y, z)):
+        """
+        move a body in the open by its velocity, like _resolvePhysics.
+        nothing can block it, so it cannot land.
+        """
+
+        if not y == 0:
+            self._moveUnchecked(body, (0, y, 0))
+
+        if not z == 0:
+            self._moveUnchecked(body, (0, 0, z))
+            self._grounded[body] = False
+            body.isFalling = True
+
+
+    def _sweptCrowded(self, lo, hi, chunk=64):
+        """
+        return mask of swept bboxes that touch the swept bbox of another body
+
+        boxes are sorted along the y axis, so each chunk of boxes is only
+        tested against the boxes that could reach it on that axis.
+        """
+
+        n = len(lo)
+        order = numpy.argsort(lo[:, 1], kind="mergesort")
+        lo = lo[order]
+        hi = hi[order]
+        left = lo[:, 1]
+        reach = (hi[:, 1] - left).max()
+
+        crowded = numpy.zeros(n, dtype=bool)
+        for start in xrange(0, n, chunk):
+            end = min(start + chunk, n)
+            first = numpy.searchsorted(left, left[start] - reach, "left")
+            last = numpy.searchsorted(left, hi[start:end, 1].max(), "right")
+            overlap = ((lo[start:end, None, :] <= hi[None, first:last, :]) &
+                       (lo[None, first:last, :] <= hi[start:end, None, :])
+                      ).all(axis=2)
+
+            # bodies always touch themselves
+            rows = numpy.arange(end - start)
+            overlap[rows, rows + start - first] = False
+            crowded[order[start:end]] = overlap.any(axis=1)
+
+        return crowded
+
+
+    def _sweptGeometry(self, lo, hi, height, margin=2):
+        """
+        return mask of swept bboxes that may touch the level geometry
+
+        this is tested against the same rects that testCollideGeometry uses,
+        with a margin to account for pygame truncating rects to integers.
+        """
+
+        # TODO: calc layer value
+        layer = 0
+
+        rects = self._geometryArrays.get(layer, None)
+        if rects is None or self.extent is None:
+            return numpy.ones(len(lo), dtype=bool)
+
+        # see toRect
+        left   = lo[:, 1] - margin
+        right  = hi[:, 1] + margin
+        top    = lo[:, 2] + height - margin
+        bottom = hi[:, 2] + height + margin
+
+        e = self.extent
+        hit = ~((left >= e.left) & (right <= e.right) &
+                (top >= e.top) & (bottom <= e.bottom))
+
+        if len(rects):
+            gl, gt, gr, gb = rects.T
+            hit |= ((left[:, None] < gr) & (gl < right[:, None]) &
+                    (top[:, None] < gb) & (gt < bottom[:, None])).any(axis=1)
+
+        return hit
+
+
+    def _moveUnchecked(self, body, (x, y, z)):
+        """
+        move a body without testing for collisions.  only use this if it is
+        known that the body cannot collide with anything.
+        """
+
+        originalbbox = body.bbox
+        newbbox = originalbbox.move(x, y, z)
+        body.oldbbox = body.bbox
+        body.bbox = newbbox
+        return self._afterMove(body, originalbbox, newbbox)
+
+
     # 2d physics only
     def updatePhysics(self, body, time):
         """
@@ -520,27 +979,37 @@ class Area(AbstractArea):
             body.acc += Vec2d((0, 9.8)) * time
     
         body.vel = body.acc * time
+        self._resolvePhysics(body, self.movePosition)
+
+
+    def _resolvePhysics(self, body, move):
+        """
+        move the body by its velocity and handle landing/falling
+        """
+
         y, z = body.vel
 
         if not y==0:
-            self.movePosition(body, (0, y, 0))
+            move(body, (0, y, 0))
 
         if z > 0: 
-            falling = self.movePosition(body, (0, 0, z))
+            falling = move(body, (0, 0, z))
             if falling:
                 body.isFalling = True
                 self._grounded[body] = False
             else:
+                # landing speed, as it would be for an update of physicsTime
+                speed = body.vel.y * self._speedScale
                 if body.isFalling:
-                    body.parent.fallDamage(body.vel.y)
+                    body.parent.fallDamage(speed)
                 body.isFalling = False
                 self._grounded[body] = True
-                if int(body.vel.y) >= 1:
+                if int(speed) >= 1:
                     body.acc.y = -body.acc.y * .2
                 else:
                     body.acc.y = 0
         elif z < 0:
-            flying = self.movePosition(body, (0, 0, z))
+            flying = move(body, (0, 0, z))
             if flying:
                 self._grounded[body] = False
                 body.isFalling = True
@@ -583,16 +1052,117 @@ class Area(AbstractArea):
             raise Exception, msg.format(layer)
 
 
+    def testCollideGeometryMany(self, bboxes):
+        """
+        test if any of a list of bboxes collide with the layer geometry
+
+        same as testCollideGeometry, but the quadtree is only searched once
+        """
+
+        if not bboxes:
+            return False
+
+        # TODO: calc layer value
+        layer = 0
+
+        try:
+            geometry = self.geometry[layer]
+            rects = [ self.toRect(bbox) for bbox in bboxes ]
+            if not all(self.extent.contains(rect) for rect in rects):
+                return True
+            return any(geometry.hit_many(rects))
+
+        except KeyError:
+            msg = "Area Layer {} does not have a collision layer"
+            print msg.format(layer)
+            return False
+
+
     def testCollideObjects(self, bbox, skip=[]):
-        bboxes = []
-        bodies = []
+        """
+        return a list of bodies that collide with the bbox
+
+        only the bodies that are near the bbox are tested
+        """
+
+        return [ body for body in self.broadphase.hit(bbox)
+                 if not body in skip ]
+
+
+    def testCollideRay(self, origin, direction, length=None, skip=[]):
+        """
+        return a list of (distance, body) for bodies that a ray passes
+        through, closest first.  see bbox.intersectRay.
+        if length is None, the ray does not end.
+        """
+
+        hitRay = getattr(self.broadphase, "hitRay", None)
+        if hitRay:
+            hits = hitRay(origin, direction, length)
+        else:
+            if length is None:
+                length = self._rayLength(origin, direction)
+                if length is None:
+                    return []
+
+            end = [ o + d * length for o, d in zip(origin, direction) ]
+            lo = [ min(a, b) for a, b in zip(origin, end) ]
+            size = [ abs(a - b) + 1 for a, b in zip(origin, end) ]
+            hits = []
+            for body in self.broadphase.candidates(BBox(lo, size)):
+                t = intersectRay(body.bbox, origin, direction, length)
+                if t is not None:
+                    hits.append((t, body))
+            hits.sort(key=itemgetter(0))
+
+        return [ (t, body) for (t, body) in hits if not body in skip ]
 
-        for body in self.bodies.values():
-            if not body in skip:
-                bboxes.append(body.bbox)
-                bodies.append(body)
 
-        return [ bodies[i] for i in bbox.collidelistall(bboxes) ]
+    def _rayLength(self, origin, direction):
+        """
+        return the length a ray needs to reach every body in the area: the
+        distance to where it leaves the box around them.  None if there are
+        no bodies, or the ray points away from them.
+        """
+
+        if not self.bodies:
+            return None
+
+        # the box is convex, so the ray leaves it at the first side it
+        # passes on the way out
+        bboxes = [ body.bbox for body in self.bodies.values() ]
+        length = None
+        for i, (o, d) in enumerate(zip(origin, direction)):
+            if d == 0: continue
+            lo = min(bbox[i] for bbox in bboxes)
+            hi = max(bbox[i] + bbox[i + 3] for bbox in bboxes)
+            t = max((lo - o) / float(d), (hi - o) / float(d))
+            if length is None or t < length:
+                length = t
+
+        if length is None:
+            return 0
+        if length < 0:
+            return None
+        return length
+
+
+    def testCollideRadius(self, center, radius, skip=[]):
+        """
+        return a list of bodies that are at least partly within radius of
+        center.  see bbox.intersectSphere.
+        """
+
+        hitRadius = getattr(self.broadphase, "hitRadius", None)
+        if hitRadius:
+            hits = hitRadius(center, radius)
+        else:
+            lo = [ c - radius for c in center ]
+            size = [ radius * 2 + 1 ] * 3
+            hits = [ body for body in self.broadphase.candidates(BBox(lo, size))
+                     if intersectSphere(body.bbox, center, radius) ]
+
+        return [ body for body in hits if not body in skip ]
 
 
     def testCollideGeometryAll(self):
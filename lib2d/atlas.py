@@ -0,0 +1,233 @@
+"""
+Texture atlas for small images, like tiles and frames of animations.
+
+Images are copied onto a few large surfaces (pages), and drawn with
+surface.blit(page, position, area).  Many small surfaces each carry some
+overhead and are spread out in memory; a page is one block of pixels.
+
+Images are only put on a page with images that have the same pixel format
+and transparency, so an image looks the same when it is drawn from a page.
+"""
+
+from pygame import Rect, Surface, SRCALPHA, RLEACCEL, BLEND_RGBA_MAX
+from collections import deque
+from itertools import chain
+
+
+
+def shelfHeight(sizes, width, limit=None):
+    """
+    return the height of a page that fits images of these sizes, packed in
+    order onto shelves by AtlasPage.fit.  if the height passes limit, the
+    rest of the sizes are not counted.
+    """
+
+    shelves = []            # [height, used width] of each shelf
+    bottom = 0
+    for w, h in sizes:
+        for shelf in shelves:
+            if h <= shelf[0] and shelf[1] + w <= width:
+                shelf[1] += w
+                break
+        else:
+            shelves.append([h, w])
+            bottom += h
+            if limit is not None and bottom >= limit:
+                break
+
+    return bottom
+
+
+def hasPixelAlpha(image):
+    """
+    return True if the image has an alpha channel.  the SRCALPHA flag is not
+    used for this, since it is also set for surfaces that only have an alpha
+    value for the whole surface.
+    """
+
+    return bool(image.get_masks()[3])
+
+
+class AtlasPage(object):
+    """
+    One surface of an atlas.  Images are packed onto shelves: rows as tall
+    as the first image put on them, which are filled left to right.
+    """
+
+    def __init__(self, size, image):
+        self.size = size
+        self.shelves = []       # [top, height, used width] of each shelf
+        self.bottom = 0         # top of the next shelf
+        self.noFit = None       # smallest size that did not fit
+
+        self.pixelAlpha = hasPixelAlpha(image)
+        self.colorkey = image.get_colorkey()
+        if self.pixelAlpha:
+            self.surface = Surface(size, SRCALPHA, image)
+            self.surface.fill((0, 0, 0, 0))
+        else:
+            self.surface = Surface(size, 0, image)
+            if self.colorkey:
+                self.surface.fill(self.colorkey)
+                self.surface.set_colorkey(self.colorkey, RLEACCEL)
+
+            alpha = image.get_alpha()
+            if alpha is not None:
+                self.surface.set_alpha(alpha)
+
+
+    def fit(self, (w, h)):
+        """
+        return a rect on the page for an image of this size, or None if there
+        is no room left for it
+        """
+
+        # the page only fills up, so a size that is no smaller than one that
+        # did not fit will not fit either
+        if self.noFit and w >= self.noFit[0] and h >= self.noFit[1]:
+            return None
+
+        pw, ph = self.size
+        for shelf in self.shelves:
+            top, height, used = shelf
+            if h <= height and used + w <= pw:
+                shelf[2] += w
+                return Rect(used, top, w, h)
+
+        if self.bottom + h <= ph and w <= pw:
+            self.shelves.append([self.bottom, h, w])
+            self.bottom += h
+            return Rect(0, self.bottom - h, w, h)
+
+        if not self.noFit or (w <= self.noFit[0] and h <= self.noFit[1]):
+            self.noFit = (w, h)
+        return None
+
+
+    def copy(self, image, rect):
+        """
+        copy the pixels of an image to the page, without blending them
+        """
+
+        if self.pixelAlpha:
+            self.surface.blit(image, rect, None, BLEND_RGBA_MAX)
+            return
+
+        # the page has the alpha of the image, so don't apply it twice
+        if image.get_alpha() is not None:
+            image = image.copy()
+            image.set_alpha(None)
+
+        self.surface.blit(image, rect)
+
+
+
+class Atlas(object):
+    """
+    Packs images onto pages, and keeps the page and area for each image.
+
+    pages are pageSize wide.  a new page is as tall as the images being
+    packed need, or twice as tall as the last page for the same format, up
+    to the height of pageSize.  images that are too large for a page are
+    not packed, and are drawn on their own.
+    """
+
+    pageSize = (512, 512)
+
+
+    def __init__(self, pageSize=None):
+        if pageSize: self.pageSize = pageSize
+        self.pages = {}         # format of images -> list of AtlasPage
+        self.entries = {}       # image -> (surface, area)
+
+
+    def __contains__(self, image):
+        return image in self.entries
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def getFormat(self, image):
+        """
+        return a key for the format of the image.  only images with the same
+        key can share a page.
+        """
+
+        return (image.get_bitsize(), image.get_masks(),
+                image.get_colorkey(), image.get_alpha())
+
+
+    def add(self, image, pending=()):
+        """
+        pack an image, and return (surface, area) to draw it with.
+        an image that is already packed is not copied again.
+
+        pending are images of the same format that will be packed next, so a
+        new page can be made large enough for them too.
+        """
+
+        try:
+            return self.entries[image]
+        except KeyError:
+            pass
+
+        size = image.get_size()
+        pages = self.pages.setdefault(self.getFormat(image), [])
+
+        rect = None
+        for page in pages:
+            rect = page.fit(size)
+            if rect: break
+
+        if rect is None:
+            w, h = self.pageSize
+            if size[0] > w or size[1] > h:
+                entry = (image, None)
+                self.entries[image] = entry
+                return entry
+
+            sizes = chain([ size ], (i.get_size() for i in pending))
+            height = shelfHeight(sizes, w, h)
+            if pages:
+                height = max(height, pages[-1].size[1] * 2)
+            height = min(h, height)
+            page = AtlasPage((w, height), image)
+            pages.append(page)
+            rect = page.fit(size)
+
+        page.copy(image, rect)
+        entry = (page.surface, rect)
+        self.entries[image] = entry
+        return entry
+
+
+    def addList(self, images):
+        """
+        pack a list of images, tallest first so the shelves are filled well.
+        return a list of (surface, area) in the same order as the images.
+        images that are not surfaces (0 or None) are returned as they are.
+        """
+
+        formats = {}
+        for image in set(i for i in images if i and i not in self.entries):
+            formats.setdefault(self.getFormat(image), []).append(image)
+
+        # the images left to pack are only looked at when a page is made
+        for group in formats.values():
+            group.sort(key=lambda i: -i.get_height())
+            pending = deque(group)
+            while pending:
+                self.add(pending.popleft(), pending)
+
+        return [ self.entries[i] if i else (i, None) for i in images ]
+
+
+    def getSurfaces(self):
+        """
+        return a list of the surfaces of the pages
+        """
+
+        return [ page.surface for pages in self.pages.values()
+                 for page in pages ]
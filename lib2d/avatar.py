@@ -48,6 +48,7 @@ class Avatar(GameObject):
         self.default      = None
         self.callback     = None    # called when animation finishes
         self.curImage     = None    # cached for drawing ops
+        self.curArea      = None    # (surface, area) to blit curImage with
         self.curFrame     = None    # current frame number
         self.curAnimation = None
         self.animations   = {}
@@ -69,19 +70,21 @@ class Avatar(GameObject):
             self.play(self.default)
 
         if not angle == self._prevAngle:
-            self.curImage = self.curAnimation.getImage(self.curFrame, angle)
-            self._rect = self.curImage.get_rect().move(self.axis)
-            if self.flip: self.curImage = flip(self.curImage, 1, 0)
+            self._setImage(angle)
 
         elif not self.curFrame == self._prevFrame:
-            self.curImage = self.curAnimation.getImage(self.curFrame, angle) 
-            self._rect = self.curImage.get_rect().move(self.axis)
-            if self.flip: self.curImage = flip(self.curImage, 1, 0)
+            self._setImage(angle)
 
         elif self.curImage == None:
-            self.curImage = self.curAnimation.getImage(self.curFrame, angle) 
-            self._rect = self.curImage.get_rect().move(self.axis)
-            if self.flip: self.curImage = flip(self.curImage, 1, 0)
+            self._setImage(angle)
+
+
+    def _setImage(self, angle):
+        self.curImage = self.curAnimation.getImage(self.curFrame, angle)
+        self._rect = self.curImage.get_rect().move(self.axis)
+        self.curArea = self.curAnimation.getFrame(self.curFrame, angle,
+                                                  self.flip)
+        if self.flip: self.curImage = flip(self.curImage, 1, 0)
 
 
     def get_rect(self):
@@ -106,6 +109,16 @@ class Avatar(GameObject):
         return self.curImage
 
 
+    @property
+    def frame(self):
+        """
+        (surface, area) to blit the current image with.  the surface is the
+        page of an atlas if the animation was packed into one.
+        """
+        self._updateCache()
+        return self.curArea
+
+
     @property    
     def visible(self):
         return self._is_visible
@@ -133,6 +146,7 @@ class Avatar(GameObject):
 
     def unload(self):
         self.curImage = None
+        self.curArea = None
 
 
     def update(self, time):
@@ -283,6 +297,7 @@ class Avatar(GameObject):
             self.callback = None
             self.curAnimation = None
             self.curImage = None
+            self.curArea = None
             self.curFrame = None
             self.default = None
             self._is_paused = True
@@ -335,6 +350,9 @@ class Animation(GameObject):
 
     The animation loader expects the image to be in a specific format.
 
+    If the animation belongs to an area that has an atlas, the frames are
+    packed into it when they are loaded.  See getFrame.
+
     TODO: implement some sort of timing, rather than relying on frames
     """
 
@@ -344,7 +362,7 @@ class Animation(GameObject):
         GameObject.__init__(self)
 
         self.filename = filename
-        self.name = name
+        self.setName(name)
         self.order = None
 
         if isinstance(frames, int):
@@ -359,6 +377,8 @@ class Animation(GameObject):
         self.directions = directions
         self.timing = timing
         self.images = []
+        self.atlas = None
+        self.areas = {}     # (image, flipped) -> (surface, area)
 
 
     def returnNew(self):
@@ -391,6 +411,8 @@ class Animation(GameObject):
                 self.images[(x/tw)+d*self.real_frames] = frame
             d += 1
 
+        self.packFrames(self.images)
+
         if isinstance(self.timing, int):
             self.timing = [self.timing] * self.frames
 
@@ -400,6 +422,57 @@ class Animation(GameObject):
 
     def unload(self):
         self.images = []
+        self.atlas = None
+        self.areas = {}
+
+
+    def getAtlas(self):
+        """
+        return the atlas of the area this animation is in, or None
+        """
+
+        node = self.parent
+        while node is not None:
+            atlas = getattr(node, "atlas", None)
+            if atlas is not None:
+                return atlas
+            node = node.parent
+
+        return None
+
+
+    def packFrames(self, images):
+        """
+        pack the frames into the atlas of the area, if there is one
+        """
+
+        self.atlas = self.getAtlas()
+        self.areas = {}
+        if self.atlas is not None:
+            for image, entry in zip(images, self.atlas.addList(images)):
+                self.areas[(image, False)] = entry
+
+
+    def getFrame(self, number, direction=0, flipped=False):
+        """
+        return (surface, area) to blit a frame with, like getImage.  if
+        flipped, the frame is flipped horizontally.
+        """
+
+        image = self.getImage(number, direction)
+        try:
+            return self.areas[(image, flipped)]
+        except KeyError:
+            pass
+
+        frame = flip(image, 1, 0) if flipped else image
+        if self.atlas is None:
+            entry = (frame, None)
+        else:
+            entry = self.atlas.add(frame)
+
+        self.areas[(image, flipped)] = entry
+        return entry
 
 
     def getTTL(self, number):
@@ -449,11 +522,13 @@ class StaticAnimation(Animation):
         GameObject.__init__(self)
 
         self.filename = filename
-        self.name = name
+        self.setName(name)
         self.tile = tile
         self.size = size
 
         self.image = None
+        self.atlas = None
+        self.areas = {}
 
     def returnNew(self):
         return self
@@ -461,6 +536,8 @@ class StaticAnimation(Animation):
 
     def unload(self):
         self.image = None
+        self.atlas = None
+        self.areas = {}
 
 
     def load(self):
@@ -484,6 +561,7 @@ class StaticAnimation(Animation):
             self.image = image
 
         self.frames = [self.image]
+        self.packFrames(self.frames)
 
 
     def getTTL(self, number):
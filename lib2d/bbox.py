@@ -1,4 +1,19 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+
 def intersect(a, b):
+    """
+    return True if two bboxes overlap.
+
+    the sides of a bbox are half-open: boxes that only touch on a side do not
+    collide, and a box with no size collides like a point.  this is the same
+    test as collidepoint, and is the test used by BBoxArray.
+    """
+
     return (((a.back   >= b.back   and a.back   < b.front)   or
              (b.back   >= a.back   and b.back   < a.front))  and
             ((a.left   >= b.left   and a.left   < b.right)   or 
@@ -6,12 +21,47 @@ def intersect(a, b):
             ((a.bottom >= b.bottom and a.bottom < b.top)     or
              (b.bottom >= a.bottom and b.bottom < a.top)))
 
-# BUG: collisions on right side are not correct
 
-#def intersect(a, b):
-#    return not (b.back > a.front or b.front < a.back or
-#                b.left > a.right or b.right < a.left or
-#                b.bottom > a.top or b.top < a.bottom)
+def intersectRay(bbox, origin, direction, length=None):
+    """
+    return the distance along a ray to where it enters the bbox, or None if
+    it does not.  distance is in multiples of the direction vector, so use a
+    unit vector for real distances.  a ray that starts inside returns 0.
+    """
+
+    near = 0.0
+    far = length
+    for o, d, lo, hi in zip(origin, direction, bbox.origin,
+                            (bbox.front, bbox.right, bbox.top)):
+        if d == 0:
+            if o < lo or o > hi: return None
+            continue
+
+        t1 = (lo - o) / float(d)
+        t2 = (hi - o) / float(d)
+        if t1 > t2: t1, t2 = t2, t1
+        if t1 > near: near = t1
+        if far is None or t2 < far: far = t2
+        if near > far: return None
+
+    return near
+
+
+def intersectSphere(bbox, center, radius):
+    """
+    return True if any part of a bbox is within radius of center
+    """
+
+    dist = 0.0
+    for c, lo, hi in zip(center, bbox.origin,
+                         (bbox.front, bbox.right, bbox.top)):
+        if c < lo:
+            dist += (lo - c) ** 2
+        elif c > hi:
+            dist += (c - hi) ** 2
+
+    return dist <= radius * radius
+
 
 class BBox(object):
     """
@@ -65,22 +115,16 @@ class BBox(object):
 
 
     def __getitem__(self, key):
-
-        if key == 0:
-            return self._x
-        elif key == 1:
-            return self._y
-        elif key == 2:
-            return self._z
-        elif key == 3:
-            return self._d
-        elif key == 4:
-            return self._w
-        elif key == 5:
-            return self._h
+        # only 0 to 5: no negative indexes or slices
+        if key in (0, 1, 2, 3, 4, 5):
+            return (self._x, self._y, self._z, self._d, self._w, self._h)[key]
         raise IndexError, key
 
 
+    def __iter__(self):
+        return iter((self._x, self._y, self._z, self._d, self._w, self._h))
+
+
     def copy(self):
         return BBox(self)
 
@@ -141,18 +185,13 @@ class BBox(object):
 
 
     def contains(self, other):
-        raise NotImplementedError
         other = BBox(other)
-        # this is not correct!
-        return ((self._x <= other.back) and
-                (self._y <= other.top) and
-                (self._z <= other.front) and
-                (self._x + self._w >= other.right) and
-                (self._y + self._h >= other.bottom) and
-                (self._z + self._d >= other.back) and
-                (self._x + self._w > other.left) and
-                (self._y + self._h > other.top) and
-                (self._z + self._d > other.front))
+        return ((self.back   <= other.back)   and
+                (self.left   <= other.left)   and
+                (self.bottom <= other.bottom) and
+                (self.front  >= other.front)  and
+                (self.right  >= other.right)  and
+                (self.top    >= other.top))
 
 
     def collidepoint(self, (x, y, z)):
@@ -268,3 +307,122 @@ class BBox(object):
     @property
     def z(self):
         return self._z
+
+
+
+class BBoxArray(object):
+    """
+    Array of BBoxes, for testing many of them at once with numpy.
+
+    Boxes are stored as rows of (x, y, z, depth, width, height).  Collision
+    tests are the same as the module intersect, so results match calling
+    BBox.collidelistall on each of the boxes.
+    """
+
+    def __init__(self, bboxes=()):
+        if numpy is None:
+            raise ImportError, "BBoxArray requires numpy"
+
+        self.array = numpy.array([ tuple(b) for b in bboxes ],
+                                 dtype=float).reshape(-1, 6)
+
+
+    def __len__(self):
+        return len(self.array)
+
+
+    def __getitem__(self, i):
+        return BBox(self.array[i].tolist())
+
+
+    def __setitem__(self, i, bbox):
+        self.array[i] = tuple(bbox)
+
+
+    @property
+    def lo(self):
+        """ (back, left, bottom) of each box """
+        return self.array[:, :3]
+
+
+    @property
+    def hi(self):
+        """ (front, right, top) of each box """
+        return self.array[:, :3] + self.array[:, 3:]
+
+
+    @staticmethod
+    def _intersect(alo, ahi, blo, bhi):
+        return (((alo >= blo) & (alo < bhi)) |
+                ((blo >= alo) & (blo < ahi))).all(axis=-1)
+
+
+    def collide(self, bbox):
+        """
+        return an array of the indexes of boxes that collide with the bbox
+        """
+
+        bbox = BBox(bbox)
+        lo = numpy.array(bbox.origin, dtype=float)
+        hi = lo + bbox.size
+        return numpy.flatnonzero(self._intersect(self.lo, self.hi, lo, hi))
+
+
+    def collidepoint(self, point):
+        """
+        return an array of the indexes of boxes that contain the point
+        """
+
+        point = numpy.array(point, dtype=float)
+        return numpy.flatnonzero(((self.lo <= point) &
+                                  (point < self.hi)).all(axis=1))
+
+
+    def contains(self, bbox):
+        """
+        return an array of the indexes of boxes that fully contain the bbox
+        """
+
+        bbox = BBox(bbox)
+        lo = numpy.array(bbox.origin, dtype=float)
+        hi = lo + bbox.size
+        return numpy.flatnonzero(((self.lo <= lo) &
+                                  (self.hi >= hi)).all(axis=1))
+
+
+    def collide_all_pairs(self):
+        """
+        return an (n, 2) array of the index pairs of boxes that collide.
+        each pair is (lower index, higher index), and pairs are sorted.
+
+        boxes are sorted along the y axis, and only boxes that reach each
+        other on that axis are tested on all three.
+        """
+
+        n = len(self.array)
+        if n < 2:
+            return numpy.zeros((0, 2), dtype=int)
+
+        lo = self.lo
+        hi = self.hi
+        order = numpy.argsort(lo[:, 1], kind="mergesort")
+        lo = lo[order]
+        hi = hi[order]
+
+        # each box is paired with the boxes after it that start before it ends
+        end = numpy.searchsorted(lo[:, 1], hi[:, 1], "right")
+        counts = numpy.maximum(end - numpy.arange(1, n + 1), 0)
+        total = counts.sum()
+        if not total:
+            return numpy.zeros((0, 2), dtype=int)
+
+        a = numpy.repeat(numpy.arange(n), counts)
+        starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        b = a + 1 + numpy.arange(total) - starts
+
+        hit = self._intersect(lo[a], hi[a], lo[b], hi[b])
+        a = order[a[hit]]
+        b = order[b[hit]]
+
+        pairs = numpy.column_stack((numpy.minimum(a, b), numpy.maximum(a, b)))
+        return pairs[numpy.lexsort((pairs[:, 1], pairs[:, 0]))]
@@ -0,0 +1,318 @@
+"""
+Dynamic 3d bounding volume tree for BBoxes.
+
+The other indexes in this package only use the y and z axis, since the x
+axis (depth) of a platformer area is very shallow.  For top-down maps, or
+maps with several depth layers, this tree tests all three axis, so bodies
+at different depths are never returned as candidates for each other.
+
+This is the same tree as AABBTree, with a third axis.  Along with testing
+boxes, it can find the bodies along a ray, or within a distance of a point.
+"""
+
+from aabbtree import AABBTree, NULL
+from bbox import intersect, intersectRay, intersectSphere
+from operator import itemgetter
+
+
+
+class BBoxTree(AABBTree):
+    """
+    Stores items by BBox.
+
+    Box queries use the same test as BBox.collidebbox.
+    """
+
+    def __init__(self, margin=4):
+        AABBTree.__init__(self, margin)
+        self.z1 = []
+        self.z2 = []
+
+
+    def insert(self, item, bbox):
+        """
+        add an item to the tree and return the id of its leaf
+        """
+
+        if item in self.leaves:
+            msg = "Item {} is already in the tree"
+            raise ValueError, msg.format(item)
+
+        leaf = self._allocate()
+        self.height[leaf] = 0
+        self.items[leaf] = item
+        self._setBounds(leaf, bbox)
+
+        self.leaves[item] = leaf
+        self._insertLeaf(leaf)
+        return leaf
+
+
+    def update(self, item, bbox):
+        """
+        call when an item has moved.
+
+        returns True if the tree had to be changed, or False if the item is
+        still inside of its fat bbox.
+        """
+
+        leaf = self.leaves[item]
+        self.tight[leaf] = bbox
+
+        if (bbox.back >= self.x1[leaf] and bbox.front <= self.x2[leaf] and
+            bbox.left >= self.y1[leaf] and bbox.right <= self.y2[leaf] and
+            bbox.bottom >= self.z1[leaf] and bbox.top <= self.z2[leaf]):
+            return False
+
+        self._removeLeaf(leaf)
+        self._setBounds(leaf, bbox)
+        self._insertLeaf(leaf)
+        return True
+
+
+    def query(self, bbox):
+        """
+        return a list of the leaf ids of items that collide with the bbox
+        """
+
+        if self.root == NULL:
+            return []
+
+        x1, y1, z1 = bbox.origin
+        x2, y2, z2 = bbox.front, bbox.right, bbox.top
+
+        X1, Y1, Z1 = self.x1, self.y1, self.z1
+        X2, Y2, Z2 = self.x2, self.y2, self.z2
+        child1, child2, tight = self.child1, self.child2, self.tight
+
+        hits = []
+        stack = [self.root]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node = pop()
+            if (x1 > X2[node] or X1[node] > x2 or y1 > Y2[node] or
+                Y1[node] > y2 or z1 > Z2[node] or Z1[node] > z2):
+                continue
+
+            if child1[node] == NULL:
+                if intersect(bbox, tight[node]):
+                    hits.append(node)
+            else:
+                push(child1[node])
+                push(child2[node])
+
+        return hits
+
+
+    def hitRay(self, origin, direction, length=None):
+        """
+        return a list of (distance, item) for items that a ray passes
+        through, closest first.  see bbox.intersectRay.
+        """
+
+        if self.root == NULL:
+            return []
+
+        X1, Y1, Z1 = self.x1, self.y1, self.z1
+        X2, Y2, Z2 = self.x2, self.y2, self.z2
+        child1, child2, tight = self.child1, self.child2, self.tight
+        ox, oy, oz = origin
+
+        # 1/d for each axis, None if the ray is parallel to it
+        inv = [ 1.0 / d if d else None for d in direction ]
+
+        def slab(o, lo, hi, i, near, far):
+            if inv[i] is None:
+                if o < lo or o > hi: return None, None
+                return near, far
+            t1 = (lo - o) * inv[i]
+            t2 = (hi - o) * inv[i]
+            if t1 > t2: t1, t2 = t2, t1
+            if t1 > near: near = t1
+            if far is None or t2 < far: far = t2
+            return near, far
+
+        hits = []
+        stack = [self.root]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node = pop()
+            near, far = slab(ox, X1[node], X2[node], 0, 0.0, length)
+            if near is None or (far is not None and near > far): continue
+            near, far = slab(oy, Y1[node], Y2[node], 1, near, far)
+            if near is None or (far is not None and near > far): continue
+            near, far = slab(oz, Z1[node], Z2[node], 2, near, far)
+            if near is None or (far is not None and near > far): continue
+
+            if child1[node] == NULL:
+                t = intersectRay(tight[node], origin, direction, length)
+                if t is not None:
+                    hits.append((t, self.items[node]))
+            else:
+                push(child1[node])
+                push(child2[node])
+
+        hits.sort(key=itemgetter(0))
+        return hits
+
+
+    def hitRadius(self, center, radius):
+        """
+        return a list of items that are at least partly within radius of
+        center.  see bbox.intersectSphere.
+        """
+
+        if self.root == NULL:
+            return []
+
+        X1, Y1, Z1 = self.x1, self.y1, self.z1
+        X2, Y2, Z2 = self.x2, self.y2, self.z2
+        child1, child2, tight = self.child1, self.child2, self.tight
+        cx, cy, cz = center
+        r2 = radius * radius
+
+        hits = []
+        stack = [self.root]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node = pop()
+
+            dist = 0.0
+            for c, lo, hi in ((cx, X1[node], X2[node]),
+                              (cy, Y1[node], Y2[node]),
+                              (cz, Z1[node], Z2[node])):
+                if c < lo:
+                    dist += (lo - c) ** 2
+                elif c > hi:
+                    dist += (c - hi) ** 2
+            if dist > r2: continue
+
+            if child1[node] == NULL:
+                if intersectSphere(tight[node], center, radius):
+                    hits.append(self.items[node])
+            else:
+                push(child1[node])
+                push(child2[node])
+
+        return hits
+
+
+    def _setBounds(self, leaf, bbox):
+        m = self.margin
+        self.x1[leaf] = bbox.back - m
+        self.y1[leaf] = bbox.left - m
+        self.z1[leaf] = bbox.bottom - m
+        self.x2[leaf] = bbox.front + m
+        self.y2[leaf] = bbox.right + m
+        self.z2[leaf] = bbox.top + m
+        self.tight[leaf] = bbox
+
+
+    def _allocate(self):
+        node = AABBTree._allocate(self)
+        while len(self.z1) < len(self.x1):
+            self.z1.append(0)
+            self.z2.append(0)
+        return node
+
+
+    def _fit(self, node, a, b):
+        """
+        set the bounds of node to the union of nodes a and b
+        """
+
+        AABBTree._fit(self, node, a, b)
+        self.z1[node] = min(self.z1[a], self.z1[b])
+        self.z2[node] = max(self.z2[a], self.z2[b])
+
+
+    def _costs(self, leaf):
+        """
+        same as AABBTree._costs, with the third axis
+        """
+
+        X1, Y1, Z1 = self.x1, self.y1, self.z1
+        X2, Y2, Z2 = self.x2, self.y2, self.z2
+        lx1, ly1, lz1 = X1[leaf], Y1[leaf], Z1[leaf]
+        lx2, ly2, lz2 = X2[leaf], Y2[leaf], Z2[leaf]
+
+        def cost(node):
+            x1, y1, z1 = X1[node], Y1[node], Z1[node]
+            x2, y2, z2 = X2[node], Y2[node], Z2[node]
+            union = (max(x2, lx2) - min(x1, lx1) +
+                     max(y2, ly2) - min(y1, ly1) +
+                     max(z2, lz2) - min(z1, lz1))
+            return union, union - (x2 - x1 + y2 - y1 + z2 - z1)
+
+        return cost
+
+
+
+class BBoxTreeBroadphase(object):
+    """
+    Broadphase for bodies in an Area, using a BBoxTree.
+
+    Has the same interface as SpatialHash, and can also find bodies along a
+    ray or within a radius.  Use this for maps where depth matters.
+    """
+
+    def __init__(self, margin=4):
+        self.tree = BBoxTree(margin)
+        self.touched = None     # if a set, bodies added or moved are put here
+
+
+    def __len__(self):
+        return len(self.tree)
+
+
+    def __contains__(self, body):
+        return body in self.tree
+
+
+    def add(self, body):
+        if self.touched is not None:
+            self.touched.add(body)
+
+        self.tree.insert(body, body.bbox)
+
+
+    def remove(self, body):
+        try:
+            self.tree.remove(body)
+        except ValueError:
+            pass
+
+
+    def update(self, body):
+        """
+        call when the bbox of a body has changed
+        """
+
+        if body not in self.tree:
+            return
+
+        if self.touched is not None:
+            self.touched.add(body)
+
+        self.tree.update(body, body.bbox)
+
+
+    def candidates(self, bbox):
+        return set(self.hit(bbox))
+
+
+    def hit(self, bbox):
+        """
+        return a list of bodies that collide with the bbox
+        """
+
+        items = self.tree.items
+        return [ items[i] for i in self.tree.query(bbox) ]
+
+
+    def hitRay(self, origin, direction, length=None):
+        return self.tree.hitRay(origin, direction, length)
+
+
+    def hitRadius(self, center, radius):
+        return self.tree.hitRadius(center, radius)
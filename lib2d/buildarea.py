@@ -24,7 +24,7 @@ def fromTMX(parent, mapname):
     parent.add(area)
     area.setParent(parent)
     area.mappath = res.mapPath(mapname)
-    data = tmxloader.load_tmx(area.mappath)
+    data = tmxloader.load_tmx(area.mappath, cache=True)
 
 
     for gid, prop in data.tile_properties.items():
@@ -184,13 +184,13 @@ def fromTMX(parent, mapname):
 
 
     #haccckk
-    for lift in [ i for i in area.getChildren() if isinstance(i, Lift) ]:
+    for lift in area.childrenOfType(Lift):
         body = lift.parent.getBody(lift)
         body.bbox = body.bbox.move(0,0,1)
 
     pushback = ['Desk', 'Callbutton', 'Terminal']
 
-    for i in [ i for i in area.getChildren() if i.name in pushback ]:
+    for i in [ i for name in pushback for i in area.childrenByName(name) ]:
         body = lift.parent.getBody(i)
         body.bbox = body.bbox.move(-16,0,0)
 
@@ -75,9 +75,12 @@ class GameState(object):
         pass
 
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
         """
         Called when state can draw to the screen
+
+        Alpha is how far the frame is between the last update and the next,
+        from 0 to 1.  It can be used to smooth movement between updates.
         """
 
         pass
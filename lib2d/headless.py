@@ -0,0 +1,198 @@
+"""
+Headless driver for running game states without a window.
+
+This is used to benchmark the game and to catch performance regressions on
+machines that do not have a display.  SDL's dummy video and audio drivers
+are used, so images and sounds can still be loaded and converted, but
+nothing is ever shown or played.
+
+Unlike the StateDriver, time does not come from a clock.  The state is
+updated a fixed number of times, as fast as it can be, and player input
+is replayed from an InputRecording.
+"""
+
+import os, sys, time
+
+
+class HeadlessReport(object):
+    """
+    Results from a HeadlessDriver run.
+    """
+
+    def __init__(self, ticks, elapsed, phases, peak_memory, load_time=None):
+        self.ticks = ticks
+        self.elapsed = elapsed
+        self.load_time = load_time      # seconds to activate the state
+        self.phases = phases            # phase name -> (calls, seconds)
+        self.peak_memory = peak_memory  # kilobytes, None if unknown
+
+
+    @property
+    def ticks_per_second(self):
+        try:
+            return self.ticks / self.elapsed
+        except ZeroDivisionError:
+            return 0.0
+
+
+    def __str__(self):
+        lines = []
+        if self.load_time is not None:
+            lines.append("load:         {:.3f} s".format(self.load_time))
+        lines.append("ticks:        {}".format(self.ticks))
+        lines.append("elapsed:      {:.3f} s".format(self.elapsed))
+        lines.append("ticks/sec:    {:.1f}".format(self.ticks_per_second))
+        if self.peak_memory is not None:
+            lines.append("peak memory:  {:.1f} MB".format(
+                         self.peak_memory / 1024.0))
+
+        lines.append("")
+        lines.append("{:<14} {:>8} {:>10} {:>10} {:>7}".format(
+                     "phase", "calls", "total ms", "ms/call", "%"))
+        for name, (calls, seconds) in sorted(self.phases.items(),
+                                             key=lambda i: -i[1][1]):
+            try:
+                per_call = seconds / calls * 1000
+            except ZeroDivisionError:
+                per_call = 0.0
+            try:
+                percent = seconds / self.elapsed * 100
+            except ZeroDivisionError:
+                percent = 0.0
+            lines.append("{:<14} {:>8} {:>10.1f} {:>10.3f} {:>7.1f}".format(
+                         name, calls, seconds * 1000, per_call, percent))
+
+        return "\n".join(lines)
+
+
+def peakMemory():
+    """
+    return the peak memory used by this process in kilobytes, or None
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # darwin reports bytes, everything else kilobytes
+    if sys.platform == "darwin":
+        peak /= 1024
+
+    return peak
+
+
+class HeadlessDriver(object):
+    """
+    Runs a state with no window, for a set number of updates.
+
+    Create the driver before loading anything that needs the display, such
+    as the world or images, since pygame has to be set up with the dummy
+    drivers first.
+    """
+
+    def __init__(self, size=(640, 480)):
+        # these must be set before pygame is initialized
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+        import pygame
+        pygame.init()
+
+        # a display mode is required to convert images, even if not shown
+        self._screen = pygame.display.set_mode(size)
+        self.phases = {}
+        self.load_time = None
+
+
+    def get_screen(self):
+        return self._screen
+
+
+    def get_size(self):
+        return self._screen.get_size()
+
+
+    def timePhase(self, obj, name, phase=None):
+        """
+        time a method of an object, and report it as its own phase.
+
+        useful to break down where time goes inside of an update.
+        """
+
+        if phase == None: phase = name
+        method = getattr(obj, name)
+        phases = self.phases
+        clock = time.time
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                calls, seconds = phases.get(phase, (0, 0.0))
+                phases[phase] = (calls + 1, seconds + clock() - start)
+
+        setattr(obj, name, timed)
+
+
+    def _timed(self, phase, func, *args):
+        start = time.time()
+        result = func(*args)
+        calls, seconds = self.phases.get(phase, (0, 0.0))
+        self.phases[phase] = (calls + 1, seconds + time.time() - start)
+        return result
+
+
+    def start(self, state):
+        """
+        activate the state and draw it once, so it is ready to be updated.
+        """
+
+        start = time.time()
+        if not state.activated:
+            state.activate()
+            state.activated = True
+
+        # states may not update until they have been drawn once
+        state.draw(self._screen, 1.0)
+        self.load_time = time.time() - start
+
+
+    def run(self, state, ticks, recording=None, time_step=3.0, draw_every=10):
+        """
+        update a state a number of times.  call start() first.
+
+        recording: InputRecording to replay through handle_commandlist
+        time_step: time passed to each update
+        draw_every: draw after this many updates, or never if 0
+
+        returns a HeadlessReport
+        """
+
+        if recording:
+            replay = recording.replay()
+            pending = next(replay, None)
+        else:
+            pending = None
+
+        start = time.time()
+        for tick in xrange(ticks):
+
+            # replay input that was handled before this update
+            now = getattr(state, "ticks", tick)
+            while pending and pending[0] <= now:
+                self._timed("input", state.handle_commandlist, pending[1])
+                pending = next(replay, None)
+
+            self._timed("update", state.update, time_step)
+
+            if draw_every and (tick + 1) % draw_every == 0:
+                self._timed("draw", state.draw, self._screen, 1.0)
+
+        elapsed = time.time() - start
+
+        return HeadlessReport(ticks, elapsed, dict(self.phases),
+                              peakMemory(), self.load_time)
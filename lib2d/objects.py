@@ -1,5 +1,6 @@
 import res
 import pygame, types, os
+from itertools import chain
 
 
 
@@ -27,12 +28,29 @@ class GameObject(object):
     if you are going to specially handle any object that will become a child of
     the object, YOU MUST HANDLE IT IN add().  failure to do so will cause
     difficult to track bugs.
+
+    the top object of a tree keeps an index of every object in it by guid,
+    and an object that is searched by name or class keeps an index of the
+    objects below it, made the first time it is searched, so lookups do not
+    have to search the tree.  they are kept in sync by add(), remove(),
+    setGUID() and setName(), so always use them rather than setting the
+    attributes directly.
+    objects that are shared between copies (see Animation.returnNew) are only
+    found in the tree of the copy they were last added to.
     """
 
     sounds = []
     gravity = True
     pushable = False
 
+    # only the top object of a tree has a guid index; see _indexOwner()
+    _guidIndex = None
+
+    # objects below this one by name and class.  None until this object is
+    # searched, see _childIndexes()
+    _nameIndex = None
+    _typeIndex = None
+
 
     def __init__(self, parent=None):
         self.short_name = str(self.__class__)
@@ -47,6 +65,7 @@ class GameObject(object):
         self.guid = None
         self.isFalling = False
         self.isAlive = True
+        self._newIndex()
 
 
     def __repr__(self):
@@ -73,6 +92,9 @@ class GameObject(object):
         new._children = []
         new._childrenGUID = []
         new.guid = None
+        new._nameIndex = None
+        new._typeIndex = None
+        new._newIndex()
 
         for child in self._children:
             new.add(child.copy())
@@ -129,23 +151,44 @@ class GameObject(object):
 
     def setGUID(self, guid):
         try:
-            self.guid = int(guid)
+            guid = int(guid)
         except:
             raise ValueError, "GUID's must be an integer"
 
+        owner = self._indexOwner()
+        owner._indexDiscard(self)
+        self.guid = guid
+        owner._indexInsert(self)
+
 
     def setName(self, name):
+        parents = self._indexedParents()
+        for parent in parents:
+            parent._childIndexDiscard(self)
         self.name = name
+        for parent in parents:
+            parent._childIndexInsert(self)
 
 
     def remove(self, other):
         try:
             self._children.remove(other)
-            other._parent = None
         except ValueError:
             msg = "Attempting to remove child ({}), but not in parent ({})"
             raise ValueError, msg.format(other, self)
 
+        parents = other._indexedParents()
+        if parents:
+            nodes = [other] + list(other.getChildren())
+            for parent in parents:
+                for node in nodes:
+                    parent._childIndexDiscard(node)
+
+        # the removed object becomes the top of its own tree
+        other._parent = None
+        self._indexOwner()._indexRemove(other)
+        other._newIndex()
+
 
     def add(self, other):
         self._children.append(other)
@@ -153,6 +196,155 @@ class GameObject(object):
             other._parent.remove(other)
         other.setParent(self)
 
+        # the tree of the other object is merged into this one
+        other._guidIndex = None
+        self._indexOwner()._indexAdd(other)
+
+        parents = other._indexedParents()
+        if parents:
+            nodes = [other] + list(other.getChildren())
+            for parent in parents:
+                for node in nodes:
+                    parent._childIndexInsert(node)
+
+
+    def _indexOwner(self):
+        """
+        return the object that holds the index for the tree this object is in.
+
+        this is normally the root, but objects that have a parent set without
+        being added to it (see buildarea) keep their own index.
+        """
+
+        node = self
+        while node._guidIndex is None:
+            if node._parent is None:
+                # objects that were saved before the index existed
+                node._newIndex()
+                break
+            node = node._parent
+        return node
+
+
+    def _newIndex(self):
+        """
+        make this object the holder of the guid index for its tree
+        """
+
+        self._guidIndex = {}    # guid -> list of objects in this tree
+        self._indexAdd(self)
+
+
+    def _indexInsert(self, obj):
+        if obj.guid is not None:
+            self._guidIndex.setdefault(obj.guid, []).append(obj)
+
+
+    def _indexDiscard(self, obj):
+        try:
+            objects = self._guidIndex[obj.guid]
+        except KeyError:
+            return
+        objects[:] = [ i for i in objects if i is not obj ]
+        if not objects:
+            del self._guidIndex[obj.guid]
+
+
+    def _indexAdd(self, obj):
+        for node in chain([obj], obj.getChildren()):
+            self._indexInsert(node)
+
+
+    def _indexRemove(self, obj):
+        for node in chain([obj], obj.getChildren()):
+            self._indexDiscard(node)
+
+
+    def _indexParents(self):
+        """
+        return the objects above this one that have it in their name and
+        class indexes: its parents, up to the top of its tree
+        """
+
+        node = self
+        while node._guidIndex is None and node._parent is not None:
+            node = node._parent
+            yield node
+
+
+    def _indexedParents(self):
+        """
+        return the objects from _indexParents() that have made their name
+        and class indexes
+        """
+
+        return [ node for node in self._indexParents()
+                 if node._typeIndex is not None ]
+
+
+    def _childIndexes(self):
+        """
+        return the (name, class) indexes of the objects below this one.
+        they are made here the first time they are needed.
+        """
+
+        if self._typeIndex is None:
+            self._nameIndex = {}    # name -> list of objects below this one
+            self._typeIndex = {}    # class -> set of objects below this one
+
+            # objects shared between copies can be found more than once
+            seen = set()
+            for child in self.getChildren():
+                if child not in seen:
+                    seen.add(child)
+                    self._childIndexInsert(child)
+
+        return self._nameIndex, self._typeIndex
+
+
+    def _childIndexInsert(self, obj):
+        # an index that was not made yet will be made when it is needed
+        if self._typeIndex is None: return
+
+        objects = self._nameIndex.setdefault(obj.name, [])
+        if obj not in objects:
+            objects.append(obj)
+        for cls in obj.__class__.__mro__:
+            self._typeIndex.setdefault(cls, set()).add(obj)
+
+
+    def _childIndexDiscard(self, obj):
+        if self._typeIndex is None: return
+
+        try:
+            objects = self._nameIndex[obj.name]
+            objects[:] = [ i for i in objects if i is not obj ]
+            if not objects:
+                del self._nameIndex[obj.name]
+        except KeyError:
+            pass
+
+        for cls in obj.__class__.__mro__:
+            try:
+                objects = self._typeIndex[cls]
+            except KeyError:
+                continue
+            objects.discard(obj)
+            if not objects:
+                del self._typeIndex[cls]
+
+
+    def _isParentOf(self, obj):
+        """
+        return True if obj is a child of this object, at any depth
+        """
+
+        node = obj._parent
+        while node is not None:
+            if node is self: return True
+            node = node._parent
+        return False
+
 
     def hasChild(self, child):
         for c in self.getChildren():
@@ -188,21 +380,38 @@ class GameObject(object):
       
         guid = int(guid) 
         if self.guid == guid: return self 
-        for child in self.getChildren():
-            if child.guid == guid: return child
+        for child in self._indexOwner()._guidIndex.get(guid, ()):
+            if self._isParentOf(child): return child
 
         msg = "GUID ({}) not found."
         raise Exception, msg.format(guid)
 
 
     def getChildByName(self, name):
-        for child in self.getChildren():
-            if child.name == name: return child
+        for child in self._childIndexes()[0].get(name, ()):
+            return child
 
         msg = "Object by name ({}) not found."
         raise Exception, msg.format(name)
 
 
+    def childrenByName(self, name):
+        """
+        return a list of all the children of this object with a name
+        """
+
+        return list(self._childIndexes()[0].get(name, ()))
+
+
+    def childrenOfType(self, cls):
+        """
+        return a list of the children of this object that are instances of
+        a class (or one of its subclasses).  the order is not defined.
+        """
+
+        return list(self._childIndexes()[1].get(cls, ()))
+
+
     def get_flag(self):
         """
         flags are binary values that are attached to the object
@@ -265,7 +474,7 @@ class GameObject(object):
             child.destroy()
         self._children = []
         self.unload()
-        self.name = name
+        self.setName(name)
 
 
     def setParent(self, parent):
@@ -189,3 +189,71 @@ class JoystickPlayerInput(PlayerInput):
             except KeyError:
                 pass
             
+
+
+class ReplayPlayerInput(PlayerInput):
+    """
+    Stands in for the input that commands in a InputRecording came from.
+    """
+
+    def getCommand(self, event):
+        return None
+
+
+
+class InputRecording(object):
+    """
+    A list of command lists, each tagged with the update (tick) they were
+    handled before.  Used to replay a play session without a player.
+
+    Saved as text, one command list per line:
+        tick cmd,arg cmd,arg ...
+    """
+
+    def __init__(self):
+        self.entries = []
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def record(self, tick, cmdlist):
+        self.entries.append((tick, [ (cmd, arg) for cls, cmd, arg in cmdlist ]))
+
+
+    def replay(self):
+        """
+        return an iterator of (tick, cmdlist) tuples, in the order they were
+        recorded.  cmdlists are in the same format as the player inputs.
+        """
+
+        for tick, cmds in self.entries:
+            yield tick, [ (ReplayPlayerInput, cmd, arg) for cmd, arg in cmds ]
+
+
+    def save(self, filename):
+        with open(filename, "w") as fh:
+            for tick, cmds in self.entries:
+                line = [str(tick)]
+                line.extend("{},{}".format(cmd, arg) for cmd, arg in cmds)
+                fh.write(" ".join(line) + "\n")
+
+
+    @classmethod
+    def load(cls, filename):
+        def number(text):
+            try:
+                return int(text)
+            except ValueError:
+                return float(text)
+
+        recording = cls()
+        with open(filename) as fh:
+            for line in fh:
+                line = line.split()
+                if not line: continue
+                cmds = [ tuple(number(i) for i in c.split(",")) for c in line[1:] ]
+                recording.entries.append((int(line[0]), cmds))
+
+        return recording
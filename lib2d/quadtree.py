@@ -5,8 +5,8 @@ In Lib2d, they are used in various parts in rendering and collision detection
 between 'sprites' and world geometry.
 
 It is important to remember that once the quadtree's are useful for static
-objects (which is why it is being used for world geometry).  There are
-probably better solutions for moving objects.
+objects (which is why it is being used for world geometry).  For moving
+objects, see aabbtree.py and spatialhash.py.
 """
 
 
@@ -187,6 +187,50 @@ class FastQuadTree(object):
         return hits
 
 
+    def hit_many(self, rects):
+        """Returns the items that overlap each of a list of rects.
+
+        The same as calling hit() for each rect, but the tree is only walked
+        once for all of them.  Returns a list of sets, in the same order as
+        the rects passed.
+
+        @param rects:
+            A sequence of pygame.Rect objects.
+        """
+
+        hits = [ set() for rect in rects ]
+        if rects:
+            self._hit_many(list(enumerate(rects)), hits)
+        return hits
+
+
+    def _hit_many(self, queries, hits):
+        # queries is a list of (index, rect) that reach this quadrant
+        items = self.items
+        if items:
+            for i, rect in queries:
+                found = rect.collidelistall(items)
+                if found:
+                    hits[i].update(tuple(items[j]) for j in found)
+
+        if self.nw:
+            q = [ (i, r) for (i, r) in queries
+                  if r.left <= self.cx and r.top <= self.cy ]
+            if q: self.nw._hit_many(q, hits)
+        if self.sw:
+            q = [ (i, r) for (i, r) in queries
+                  if r.left <= self.cx and r.bottom >= self.cy ]
+            if q: self.sw._hit_many(q, hits)
+        if self.ne:
+            q = [ (i, r) for (i, r) in queries
+                  if r.right >= self.cx and r.top <= self.cy ]
+            if q: self.ne._hit_many(q, hits)
+        if self.se:
+            q = [ (i, r) for (i, r) in queries
+                  if r.right >= self.cx and r.bottom >= self.cy ]
+            if q: self.se._hit_many(q, hits)
+
+
 class QuadTree(object):
     """Another implementation of a quad-tree.
 
@@ -0,0 +1,127 @@
+"""
+Uniform grid (spatial hash) for broadphase collision testing of bodies.
+
+The quadtrees in this package are built once from a static list of rects,
+which is fine for level geometry but not for bodies that move every frame.
+This grid is updated incrementally as bodies move, so tests only consider
+bodies that share a cell with the bbox being tested.
+
+Only the y and z axis are hashed.  The x axis (depth) of an area is very
+shallow, so it is left to the exact test.
+"""
+
+from bbox import intersect
+
+
+class SpatialHash(object):
+    """
+    Buckets bodies into square cells on the y/z plane.
+
+    Stored objects must have a .bbox attribute (a BBox).  A body that spans
+    several cells will be in all of them.
+    """
+
+    def __init__(self, cellSize=64):
+        self.cellSize = cellSize
+        self.cells = {}         # (y, z) cell -> set of bodies
+        self.bodies = {}        # body -> tuple of cells it is in
+        self.touched = None     # if a set, bodies added or moved are put here
+
+
+    def __len__(self):
+        return len(self.bodies)
+
+
+    def __contains__(self, body):
+        return body in self.bodies
+
+
+    def cellsFor(self, bbox):
+        """
+        return a tuple of the cells that a bbox touches
+        """
+
+        cs = self.cellSize
+        y0 = int(bbox.left // cs)
+        y1 = int(bbox.right // cs)
+        z0 = int(bbox.bottom // cs)
+        z1 = int(bbox.top // cs)
+
+        if y0 == y1 and z0 == z1:
+            return ((y0, z0),)
+
+        return tuple((y, z) for y in xrange(y0, y1 + 1)
+                            for z in xrange(z0, z1 + 1))
+
+
+    def add(self, body):
+        if self.touched is not None:
+            self.touched.add(body)
+
+        cells = self.cellsFor(body.bbox)
+        self.bodies[body] = cells
+        for cell in cells:
+            try:
+                self.cells[cell].add(body)
+            except KeyError:
+                self.cells[cell] = set([body])
+
+
+    def remove(self, body):
+        try:
+            cells = self.bodies.pop(body)
+        except KeyError:
+            return
+
+        for cell in cells:
+            bucket = self.cells[cell]
+            bucket.discard(body)
+            if not bucket:
+                del self.cells[cell]
+
+
+    def update(self, body):
+        """
+        call when the bbox of a body has changed
+        """
+
+        try:
+            old = self.bodies[body]
+        except KeyError:
+            return
+
+        if self.touched is not None:
+            self.touched.add(body)
+
+        cells = self.cellsFor(body.bbox)
+        if cells == old:
+            return
+
+        self.remove(body)
+        self.add(body)
+
+
+    def candidates(self, bbox):
+        """
+        return a set of the bodies that share a cell with the bbox.
+        they may or may not actually collide with it.
+        """
+
+        cells = self.cells
+        found = set()
+        for cell in self.cellsFor(bbox):
+            try:
+                found.update(cells[cell])
+            except KeyError:
+                pass
+
+        return found
+
+
+    def hit(self, bbox):
+        """
+        return a list of bodies that collide with the bbox
+        """
+
+        return [ body for body in self.candidates(bbox)
+                 if intersect(bbox, body.bbox) ]
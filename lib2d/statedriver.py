@@ -34,6 +34,20 @@ from dealing with input too often and slowing down rendering.
 
 target_fps = 30
 
+# game time that passes in one second of real time.  the game was tuned with
+# ten updates of 3.0 for every frame at 30 fps, so that is kept here.
+game_speed = 900.0
+
+# number of updates per second.  lowering this will not change the speed
+# of the game, just how much time is passed to each update.  the area scales
+# landing speeds to the tuned update length (Area.physicsTime), so fall
+# damage and bouncing do not change either.
+tick_rate = 300
+
+# most updates that will be run in one frame when catching up after a slow
+# frame.  if there are still more to run, the game will slow down instead.
+max_ticks = 30
+
 
 inputs = []
 inputs.append(KeyboardPlayerInput())
@@ -231,9 +245,15 @@ class StateDriver(object):
         cmdlist = []
         checkedcmds = []
         
+        # fixed timestep: real time is accumulated, then consumed by updates
+        # that always get the same amount of game time
+        tick_length = 1000.0 / tick_rate
+        tick_time = game_speed / tick_rate
+        accumulator = 0.0
+
         currentState = current_state()
         while currentState:
-            clock.tick(target_fps)
+            accumulator += clock.tick(target_fps)
 
             event = event_poll()
             while event:
@@ -275,49 +295,25 @@ class StateDriver(object):
             currentState = originalState
 
             if currentState:
-                time = target_fps / 10.0
-
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-
-                originalState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
+                ticks = 0
+                while accumulator >= tick_length:
+                    if ticks == max_ticks:
+                        accumulator = 0.0
+                        break
 
-                originalState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
+                    accumulator -= tick_length
+                    ticks += 1
 
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
+                    currentState.update(tick_time)
+                    currentState = current_state()
+                    if not currentState == originalState: break
 
-                currentState.update(time)
-                currentState = current_state()
                 if not currentState == originalState: continue
 
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
+                # how far the frame is between the last update and the next
+                alpha = accumulator / tick_length
 
-                dirty = currentState.draw(self._screen)
+                dirty = currentState.draw(self._screen, alpha)
                 gfx.update_display(dirty)
 
 
@@ -5,7 +5,9 @@ this time has tiled TMX maps built in and required
 """
 
 import pygame
+from time import time as clock
 from itertools import product, chain, ifilter
+from collections import OrderedDict
 from pytmx import tmxloader
 
 
@@ -35,12 +37,82 @@ class BufferedTilemapRenderer(object):
     The original library for this, Lib2d updates 4 times for every draw.  To
     take advantage of the processing done inbetween screen updates, update()
     will blit any tiles needed to the offscreen buffer.
+
+    Each update blits queued tiles for blitTime seconds, or blitPerUpdate
+    tiles if blitTime is None.  getStats() reports how many tiles are waiting
+    and how long they take to blit, which can be used to tune blitTime.
+
+    If chunkSize is set, the tile layers are rendered into chunks of that
+    many pixels, which are kept in a cache.  The buffer is filled from the
+    chunks, so scrolling is a few large blits rather than many small ones.
+    The least recently used chunks are freed when the cache uses more than
+    chunkMemory bytes.
+
+    If prefetch is set, the buffer has that many extra tiles on each side of
+    the view.  Tiles uncovered by scrolling are queued in this margin, the
+    edge the camera is moving towards first, so they are blitted during
+    update() before they can be seen, and the queue does not have to be
+    flushed while the map scrolls.  With chunks, the
+    chunks ahead of the camera are rendered while the map is idle.
+
+    If some of the map's layers were merged when it was loaded (see
+    tmxloader.merge_layers_pygame), the buffer is filled from the merged
+    layers, and tiles are drawn over sprites from the original layers.
+
+    If an atlas is passed (see lib2d.atlas), the tiles are packed into it,
+    and the buffer is filled by blitting areas of the atlas pages.
+
+    Tiles from layers above a sprite are drawn over it.  The tiles above each
+    tile are looked up the first time a sprite is on it, and kept, so sprites
+    over empty tiles are skipped, and tiles stacked above a sprite are merged
+    into one surface when that can be done without changing how they look.
+
+    The tiles are looked up in the gid data of the layers, and the image for
+    each gid is only looked up (and packed into the atlas) the first time it
+    is drawn.
     """
 
+    # size of chunks in pixels (rounded down to whole tiles), or None
+    chunkSize = None
+
+    # most bytes of chunk surfaces to keep in memory
+    chunkMemory = 8 * 1024 * 1024
+
+    # tiles drawn past each side of the view, before they are needed
+    prefetch = 0
+
+    # seconds an update may spend rendering chunks ahead of the camera
+    prefetchTime = 0.002
+
+    # seconds an update may spend blitting queued tiles, or None to blit
+    # blitPerUpdate tiles
+    blitTime = 0.002
+
+
     def __init__(self, tmx, rect, **kwargs):
         self.default_image = generateDefaultImage((tmx.tilewidth,
                                                    tmx.tileheight))
         self.tmx = tmx
+        self.chunkSize = kwargs.get("chunkSize", self.chunkSize)
+        self.chunkMemory = kwargs.get("chunkMemory", self.chunkMemory)
+        self.prefetch = kwargs.get("prefetch", self.prefetch)
+        self.blitTime = kwargs.get("blitTime", self.blitTime)
+        self.atlas = kwargs.get("atlas", None)
+        self.resetStats()
+        self.chunks = OrderedDict()     # (x, y) -> surface, oldest first
+        self.chunkBytes = 0
+
+        self.tileTable = None   # see getTileTable
+        self.drawTable = None   # see getDrawTable
+        self.drawImages = None  # gid -> (surface, area), see getDrawImage
+        self.upperTiles = {}    # (x, y, layer) -> images to draw over sprites
+        self.composites = {}    # tuple of gids -> merged images
+
+        if self.chunkSize:
+            w, h = self.chunkSize
+            self.chunkTiles = (max(1, w / tmx.tilewidth),
+                               max(1, h / tmx.tileheight))
+
         self.setSize(rect.size)
         self.rect = rect
 
@@ -62,8 +134,9 @@ class BufferedTilemapRenderer(object):
         self.oldX = self.xoffset + (left * self.tmx.tilewidth) 
         self.oldY = self.yoffset + (top  * self.tmx.tileheight)
 
-        self.bufferWidth  = size[0] + self.tmx.tilewidth * 2
-        self.bufferHeight = size[1] + self.tmx.tileheight * 2
+        margin = self.prefetch * 2 + 2
+        self.bufferWidth  = size[0] + self.tmx.tilewidth * margin
+        self.bufferHeight = size[1] + self.tmx.tileheight * margin
 
         self.size = size
 
@@ -74,7 +147,7 @@ class BufferedTilemapRenderer(object):
         self.buffer = pygame.Surface((self.bufferWidth, self.bufferHeight))
 
         # how many tiles are blitted to the buffer during an update
-        self.blitPerUpdate = int(self.view.width * 1.5)
+        self.blitPerUpdate = int((self.view.width + self.prefetch * 2) * 1.5)
 
         # quadtree is used to correctly draw tiles that cover 'sprites'
         rects = []
@@ -88,6 +161,9 @@ class BufferedTilemapRenderer(object):
         self.idle = False
         self.blank = True 
         self.queue = None
+        self.queued = 0             # number of tiles in the queue
+        self.pending = []           # rects of tiles that may still be queued
+        self.velocity = (0, 0)      # pixels the view moved in the last center
 
 
     def center(self, (x, y)):
@@ -98,6 +174,7 @@ class BufferedTilemapRenderer(object):
         """
 
         x, y = int(x), int(y)
+        self.velocity = (x - self.oldX, y - self.oldY)
 
         if (self.oldX == x) and (self.oldY == y):
             self.idle = True
@@ -147,6 +224,65 @@ class BufferedTilemapRenderer(object):
             return self.default_image
 
 
+    def makeTable(self, layers):
+        """
+        return a list of the gids of the tiles of each layer.  gids are
+        looked up with table[layer][y][x], without the checks done by
+        getTileImage.  like getTileImage, negative coords wrap around.
+
+        the table is the data of the layers (numpy arrays for numpy layers),
+        so it is not a copy of the map.
+        """
+
+        return [ layer.data for layer in layers ]
+
+
+    def getTileTable(self):
+        """
+        return the table (see makeTable) of the visible layers
+        """
+
+        if self.tileTable is None:
+            self.tileTable = self.makeTable(self.tmx.visibleTileLayers)
+
+        return self.tileTable
+
+
+    def getDrawTable(self):
+        """
+        return the table (see makeTable) of the layers blitted to the buffer.
+        the layers are the visible layers, unless some were merged.  the
+        images to blit are looked up with getDrawImage.
+        """
+
+        if self.drawTable is None:
+            layers = getattr(self.tmx, "drawlayers", None)
+            if not layers:
+                layers = self.tmx.visibleTileLayers
+
+            self.drawImages = [ None ] * len(self.tmx.images)
+            self.drawTable = self.makeTable(layers)
+
+        return self.drawTable
+
+
+    def getDrawImage(self, gid):
+        """
+        return (surface, area) to blit the tile of a gid with, from the atlas
+        if there is one.  the loops that blit tiles use drawImages[gid], and
+        only call this the first time a gid is drawn.
+        """
+
+        image = self.tmx.images[gid]
+        if image and self.atlas is not None:
+            entry = self.atlas.add(image)
+        else:
+            entry = (image, None)
+
+        self.drawImages[gid] = entry
+        return entry
+
+
     def scroll(self, (x, y)):
         """
         move the background in pixels
@@ -171,19 +307,33 @@ class BufferedTilemapRenderer(object):
         this method is mostly for internal use only
         """
 
-        # make sure that the map is completely drawn
-        self.flushQueue()
+        # make sure that the map is completely drawn.  tiles queued in the
+        # prefetch margin are blitted relative to the view, so they can wait
+        if not self.prefetch:
+            self.flushQueue()
 
         self.view = self.view.move((x, y))
 
         # scroll the image (much faster than reblitting the tiles!)
         self.buffer.scroll(-x * self.tmx.tilewidth, -y * self.tmx.tileheight)
 
+        # chunks are quick to blit, so the edges are filled right away
+        if self.chunkSize:
+            for rect in self.edgeRects((x, y)):
+                self.blitChunks(rect)
+            return
+
         # queue the missing tiles
         self.queueEdgeTiles((x, y))
 
         # prevent edges on the screen if moving too fast or camera is shaking
-        if (abs(x) > 1) or (abs(y) > 1):
+        if self.prefetch:
+            v = self.view
+            visible = pygame.Rect(v.left, v.top, v.width + 2, v.height + 2)
+            if visible.collidelist(self.pending) > -1:
+                self.flushQueue()
+
+        elif (abs(x) > 1) or (abs(y) > 1):
             self.flushQueue()
 
 
@@ -197,84 +347,368 @@ class BufferedTilemapRenderer(object):
         if (surface==depth==None) and (flags==0):
             raise ValueError, "Need to pass a surface, depth, for flags"
 
+        self.clearChunks()
+        self.tileTable = None
+        self.drawTable = None
+        self.drawImages = None
+        self.upperTiles = {}
+        self.composites = {}
+
         if surface:
-            for i, t in enumerate(self.tilemap.images):
-                if t: self.tilemap.images[i] = t.convert(surface)
+            for i, t in enumerate(self.tmx.images):
+                if t: self.tmx.images[i] = t.convert(surface)
             self.buffer = self.buffer.convert(surface)
 
         elif depth or flags:
-            for i, t in enumerate(self.tilemap.images):
+            for i, t in enumerate(self.tmx.images):
                 if t:
-                    self.tilemap.images[i] = t.convert(depth, flags)
+                    self.tmx.images[i] = t.convert(depth, flags)
             self.buffer = self.buffer.convert(depth, flags)
 
 
-    def queueEdgeTiles(self, (x, y)):
+    def bufferView(self):
         """
-        add the tiles on the edge that need to be redrawn to the queue.
-        uses a iterator for the queue
-        override if you want a different type of queue
+        return rect of the tiles in the buffer, not counting the extra row
+        and column on the right and bottom.  the buffer starts at its topleft.
         """
 
-        if self.queue == None:
-            self.queue = iter([])
+        return self.view.inflate(self.prefetch * 2, self.prefetch * 2)
 
 
+    def edgeRects(self, (x, y)):
+        """
+        return rects, in tiles, of the edges that were uncovered after the
+        view was moved.  these are the same tiles that queueEdgeTiles adds.
+        """
+
+        v = self.bufferView()
+        rects = []
+
         # right
         if x > 0:
-            p=product(xrange(self.view.right+1, self.view.right-x,-1),
-                      xrange(self.view.top, self.view.bottom + 2),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue) 
+            rects.append(pygame.Rect(v.right - x + 1, v.top, x + 1, v.height + 2))
 
         # left
         elif x < 0:
-            p=product(xrange(self.view.left, self.view.left - x),
-                      xrange(self.view.top, self.view.bottom + 2),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue) 
+            rects.append(pygame.Rect(v.left, v.top, -x, v.height + 2))
 
         # bottom
         if y > 0:
-            p=product(xrange(self.view.left, self.view.right + 2),
-                      xrange(self.view.bottom+1, self.view.bottom-y, -1),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue) 
+            rects.append(pygame.Rect(v.left, v.bottom - y + 1, v.width + 2, y + 1))
 
         # top
         elif y < 0:
-            p=product(xrange(self.view.left, self.view.right + 2),
-                      xrange(self.view.top, self.view.top - y),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue)
+            rects.append(pygame.Rect(v.left, v.top, v.width + 2, -y))
+
+        return rects
+
+
+    def getChunk(self, (cx, cy)):
+        """
+        return the surface for a chunk, rendering it if it is not cached
+        """
+
+        try:
+            chunk = self.chunks.pop((cx, cy))
+        except KeyError:
+            chunk = self.renderChunk((cx, cy))
+            self.chunkBytes += chunk.get_pitch() * chunk.get_height()
+
+            # free the chunks that have not been used for the longest time
+            while self.chunks and self.chunkBytes > self.chunkMemory:
+                key, old = self.chunks.popitem(last=False)
+                self.chunkBytes -= old.get_pitch() * old.get_height()
+
+        self.chunks[(cx, cy)] = chunk
+        return chunk
+
+
+    def renderChunk(self, (cx, cy)):
+        """
+        blit all the tiles of a chunk onto a new surface
+        """
+
+        ctw, cth = self.chunkTiles
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+
+        chunk = pygame.Surface((ctw * tw, cth * th), 0, self.buffer)
+        rect = pygame.Rect(cx * ctw, cy * cth, ctw, cth)
+        self.blitTiles(chunk, rect)
+        return chunk
+
+
+    def blitTiles(self, surface, rect):
+        """
+        blit the tiles of the draw layers in a rect (in tiles) onto a surface.
+        the top left tile of the rect is blitted at the top left of the
+        surface.
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        table = self.getDrawTable()
+        images = self.drawImages
+        getImage = self.getDrawImage
+        default = (self.default_image, None)
+        blit = surface.blit
+        left, top = rect.topleft
+        inside = rect.clip((0, 0, self.tmx.width, self.tmx.height))
+
+        # the gids of tiles on the map are copied from the table in one block
+        # for each layer, so they are looked up without any checks
+        blocks = [ self.tableBlock(data, inside) for data in table ]
+        ox = inside.left - left
+        oy = inside.top - top
+        p = product(xrange(inside.width), xrange(inside.height))
+        for x, y in p:
+            for block in blocks:
+                gid = block[y][x]
+                image, area = images[gid] or getImage(gid)
+                if image:
+                    blit(image, ((x + ox) * tw, (y + oy) * th), area)
+
+        # and the rest the slow way, if the rect is on the edge of the map
+        if inside != rect:
+            p = product(xrange(left, rect.right), xrange(top, rect.bottom))
+            for x, y in p:
+                if inside.collidepoint(x, y):
+                    continue
+                for data in table:
+                    try:
+                        gid = data[y][x]
+                        image, area = images[gid] or getImage(gid)
+                    except IndexError:
+                        image, area = default
+                    if image:
+                        blit(image, ((x - left) * tw, (y - top) * th), area)
+
+
+    def tableBlock(self, data, rect):
+        """
+        return the gids of the tiles of a layer in a rect (in tiles), as lists
+        of ints for each row.  the rect must be on the map.
+        """
+
+        if hasattr(data, "tolist"):
+            return data[rect.top:rect.bottom, rect.left:rect.right].tolist()
+
+        return [ list(row[rect.left:rect.right])
+                 for row in data[rect.top:rect.bottom] ]
+
+
+    def blitChunks(self, rect):
+        """
+        fill a rect of the buffer (in tiles) from the chunks
+        """
+
+        ctw, cth = self.chunkTiles
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        v = self.bufferView()
+        ltw = v.left * tw
+        tth = v.top * th
+        blit = self.buffer.blit
+
+        for cy in xrange(rect.top // cth, (rect.bottom - 1) // cth + 1):
+            for cx in xrange(rect.left // ctw, (rect.right - 1) // ctw + 1):
+                area = rect.clip((cx * ctw, cy * cth, ctw, cth))
+                blit(self.getChunk((cx, cy)),
+                     (area.left * tw - ltw, area.top * th - tth),
+                     ((area.left - cx * ctw) * tw, (area.top - cy * cth) * th,
+                      area.width * tw, area.height * th))
+
+
+    def prefetchChunks(self):
+        """
+        render chunks that the view is moving towards, until prefetchTime
+        has passed.  returns True if there are no more chunks to render.
+        """
+
+        ctw, cth = self.chunkTiles
+        vx, vy = self.velocity
+        v = self.bufferView()
+        v.width += 2
+        v.height += 2
+
+        # look one chunk ahead in the direction of movement
+        ahead = v.move(cmp(vx, 0) * ctw, cmp(vy, 0) * cth).union(v)
+        ahead = ahead.clip((0, 0, self.tmx.width, self.tmx.height))
+
+        start = clock()
+        for cy in xrange(ahead.top // cth, (ahead.bottom - 1) // cth + 1):
+            for cx in xrange(ahead.left // ctw, (ahead.right - 1) // ctw + 1):
+                if (cx, cy) in self.chunks:
+                    continue
+                if clock() - start > self.prefetchTime:
+                    return False
+                self.getChunk((cx, cy))
+
+        return True
+
+
+    def clearChunks(self):
+        """
+        free all the chunks.  they will be rendered again as they are needed.
+        """
+
+        self.chunks.clear()
+        self.chunkBytes = 0
+
+
+    def getStats(self):
+        """
+        return a dict of stats about blitting queued tiles:
+            queued:     tiles waiting in the queue
+            blits:      tiles taken from the queue by update()
+            blitTime:   seconds update() spent on them
+            avgBlit:    seconds for each tile
+            flushes:    times the queue had to be flushed
+            flushTime:  seconds spent flushing
+        """
+
+        try:
+            avg = self.statBlitTime / self.statBlits
+        except ZeroDivisionError:
+            avg = 0.0
+
+        return {"queued": self.queued,
+                "blits": self.statBlits,
+                "blitTime": self.statBlitTime,
+                "avgBlit": avg,
+                "flushes": self.statFlushes,
+                "flushTime": self.statFlushTime}
+
+
+    def resetStats(self):
+        self.statBlits = 0
+        self.statBlitTime = 0.0
+        self.statFlushes = 0
+        self.statFlushTime = 0.0
+
+
+    def queueTiles(self, xs, ys):
+        """
+        return an iterator of tiles to blit at every layer, and count them
+        """
+
+        layers = xrange(len(self.getDrawTable()))
+        self.queued += len(xs) * len(ys) * len(layers)
+        return product(xs, ys, layers)
+
+
+    def queueEdgeTiles(self, (x, y)):
+        """
+        add the tiles on the edge that need to be redrawn to the queue.
+        uses a iterator for the queue
+        override if you want a different type of queue
+
+        the edge the camera is moving towards fastest (see velocity) is
+        queued first.  tiles that were queued before, and that the view has
+        moved past, are dropped.
+        """
+
+        if self.queue == None:
+            self.queue = iter([])
+
+        v = self.bufferView()
+        vx, vy = self.velocity
+        edges = []      # (speed, columns, rows)
+
+        # bottom
+        if y > 0:
+            edges.append((abs(vy), xrange(v.left, v.right + 2),
+                          xrange(v.bottom+1, v.bottom-y, -1)))
+
+        # top
+        elif y < 0:
+            edges.append((abs(vy), xrange(v.left, v.right + 2),
+                          xrange(v.top, v.top - y)))
+
+        # right
+        if x > 0:
+            edges.append((abs(vx), xrange(v.right+1, v.right-x,-1),
+                          xrange(v.top, v.bottom + 2)))
+
+        # left
+        elif x < 0:
+            edges.append((abs(vx), xrange(v.left, v.left - x),
+                          xrange(v.top, v.bottom + 2)))
+
+        edges.sort(key=lambda edge: -edge[0])
+        queue = chain(*[ self.queueTiles(xs, ys) for speed, xs, ys in edges ])
+
+        # tiles that have scrolled off the trailing side of the buffer
+        inside = pygame.Rect(v.left, v.top, v.width + 2, v.height + 2)
+        before = ifilter(lambda (tx, ty, l): inside.collidepoint(tx, ty),
+                         self.queue)
+
+        # tiles that are already queued are blitted first when prefetching,
+        # since they may be below tiles that are queued again
+        if self.prefetch:
+            self.queue = chain(before, queue)
+            self.pending.extend(self.edgeRects((x, y)))
+        else:
+            self.queue = chain(queue, before)
 
 
     def update(self, time=None):
         """
         the drawing operations and management of the buffer is handled here.
         if you notice that the tiles are being drawn while the screen
-        is scrolling, you will need to adjust the number of tiles that are
-        bilt per update or increase update frequency.
+        is scrolling, you will need to adjust blitTime (or the number of
+        tiles that are bilt per update) or increase update frequency.
         """
 
         if self.queue:
             bufblit = self.buffer.blit
-            getTile = self.getTileImage
-            ltw = self.tmx.tilewidth * self.view.left
-            tth = self.tmx.tileheight * self.view.top
+            table = self.getDrawTable()
+            images = self.drawImages
+            getImage = self.getDrawImage
+            default = (self.default_image, None)
+            v = self.bufferView()
+            ltw = self.tmx.tilewidth * v.left
+            tth = self.tmx.tileheight * v.top
             tw = self.tmx.tilewidth
             th = self.tmx.tileheight
 
-            for i in range(self.blitPerUpdate):
+            start = clock()
+            if self.blitTime is None:
+                deadline = None
+            else:
+                deadline = start + self.blitTime
+
+            # at least one tile is blitted, so the queue is always drained
+            blits = 0
+            while 1:
                 try:
                     x,y,l = next(self.queue)
                 except StopIteration:
                     self.queue = None
+                    self.pending = []
                     break
 
-                image = getTile((x, y, l))
+                blits += 1
+                try:
+                    gid = table[l][y][x]
+                    image, area = images[gid] or getImage(gid)
+                except IndexError:
+                    image, area = default
                 if image:
-                    bufblit(image, (x * tw - ltw, y * th - tth))
+                    bufblit(image, (x * tw - ltw, y * th - tth), area)
+
+                if deadline is None:
+                    if blits >= self.blitPerUpdate: break
+                elif clock() >= deadline:
+                    break
+
+            self.queued = max(0, self.queued - blits) if self.queue else 0
+            self.statBlits += blits
+            self.statBlitTime += clock() - start
+
+        # nothing to blit, so get ready for where the view is going
+        elif self.prefetch and self.chunkSize:
+            self.prefetchChunks()
 
 
     def draw(self, surface, surfaces=[]):
@@ -282,10 +716,11 @@ class BufferedTilemapRenderer(object):
         draw the map onto a surface.
     
         surfaces may optionally be passed that will be blited onto the surface.
-        this must be a list of tuples containing a layer number, image, and
-        rect in screen coordinates.  surfaces will be drawn in order passed,
-        and will be correctly drawn with tiles from a higher layer overlap
-        the surface.
+        this must be a list of tuples containing an image, rect in screen
+        coordinates, and a layer number, optionally followed by the area of
+        the image to blit (for images in an atlas).  surfaces will be drawn
+        in order passed, and will be correctly drawn with tiles from a higher
+        layer overlap the surface.
 
         passing a list here will correctly draw the surfaces to create the
         illusion of depth.
@@ -298,6 +733,7 @@ class BufferedTilemapRenderer(object):
 
         surblit = surface.blit
         left, top = self.view.topleft
+        right, bottom = self.view.bottomright
         ox, oy = self.xoffset, self.yoffset
         ox -= self.rect.left
         oy -= self.rect.top
@@ -308,10 +744,12 @@ class BufferedTilemapRenderer(object):
         origClip = surface.get_clip()
         surface.set_clip(self.rect)
 
-        surblit(self.buffer, (-ox, -oy))
+        surblit(self.buffer, (-ox - self.prefetch * self.tmx.tilewidth,
+                              -oy - self.prefetch * self.tmx.tileheight))
 
         # TODO: make sure to filter out surfaces outside the screen
-        dirty = [ (surblit(a[0], a[1]), a[2]) for a in surfaces ]
+        dirty = [ (surblit(a[0], a[1], a[3] if len(a) > 3 else None), a[2])
+                  for a in surfaces ]
 
         # TODO: new sorting method for surfaces
         #       on each update, avatar sets a sorting flag if moved
@@ -320,17 +758,42 @@ class BufferedTilemapRenderer(object):
         #       finally, the 'sort' flag is set to 0 and draw order is saved
 
         # redraw tiles that overlap surfaces that were passed in
-        for dirtyRect, layer in dirty:
-            dirtyRect = dirtyRect.move(ox, oy)
-            for r in self.layerQuadtree.hit(dirtyRect):
+        hits = self.layerQuadtree.hit_many([ dirtyRect.move(ox, oy)
+                                             for dirtyRect, layer in dirty ])
+        width, height = self.tmx.width, self.tmx.height
+        nlayers = len(self.tmx.visibleTileLayers)
+        upperTiles = self.upperTiles
+
+        # the tiles that can be hit are only checked if the view is not
+        # entirely on the map
+        inside = (left >= 0 and top >= 0 and
+                  right + 2 <= width and bottom + 2 <= height)
+        for (dirtyRect, layer), tiles in zip(dirty, hits):
+            if layer + 1 >= nlayers:
+                continue
+
+            for r in tiles:
                 x, y, tw, th = r
-                for l in range(layer+1, len(self.tmx.visibleTileLayers)):
-                    # there is a collision between a tile and a image, so
-                    # we simply reblit the affected tiles over the sprite
-                    tile = getTile((x/tw + left, y/th + top, l))
-                    if tile:
+                tx = x/tw + left
+                ty = y/th + top
+
+                # there is a collision between a tile and a image, so
+                # we simply reblit the affected tiles over the sprite
+                if inside or (0 <= tx < width and 0 <= ty < height):
+                    try:
+                        images = upperTiles[(tx, ty, layer + 1)]
+                    except KeyError:
+                        images = self.getUpperTiles((tx, ty, layer + 1))
+                    for tile in images:
                         surblit(tile, (x-ox, y-oy))
 
+                # tiles off the map are drawn the slow way
+                else:
+                    for l in range(layer+1, nlayers):
+                        tile = getTile((tx, ty, l))
+                        if tile:
+                            surblit(tile, (x-ox, y-oy))
+
         # restore clipping area
         surface.set_clip(origClip)
 
@@ -340,24 +803,69 @@ class BufferedTilemapRenderer(object):
             return [ self.rect ]
 
 
+    def getUpperTiles(self, (x, y, layer)):
+        """
+        return a list of images to draw over a sprite on this tile, for this
+        layer and the layers above it.  the list is empty if there are no
+        tiles there.
+        """
+
+        table = self.getTileTable()
+        gids = [ table[l][y][x] for l in xrange(layer, len(table)) ]
+        key = tuple(int(gid) for gid in gids if gid)
+
+        try:
+            images = self.composites[key]
+        except KeyError:
+            images = self.compositeTiles([ self.tmx.images[gid]
+                                           for gid in key ])
+            self.composites[key] = images
+
+        self.upperTiles[(x, y, layer)] = images
+        return images
+
+
+    def compositeTiles(self, images):
+        """
+        return a list with fewer images that looks the same when blitted as
+        the list of images passed, if one can be made.
+        """
+
+        return tmxloader.pygame_merge(images)
+
+
     def flushQueue(self):
         """
         draw all tiles that are sitting in the queue
         """
 
         if self.queue:
+            start = clock()
             tw = self.tmx.tilewidth
             th = self.tmx.tileheight
             blit = self.buffer.blit
-            ltw = self.view.left * tw
-            tth = self.view.top * th
-            getTile = self.getTileImage
-
-            images = ifilter(lambda x: x[1], ((i, getTile(i)) for i in self.queue) )
-
-            [ blit(image, (x*tw-ltw, y * th-tth)) for ((x,y,l), image) in images ]
+            v = self.bufferView()
+            ltw = v.left * tw
+            tth = v.top * th
+            table = self.getDrawTable()
+            images = self.drawImages
+            getImage = self.getDrawImage
+            default = (self.default_image, None)
+
+            for x, y, l in self.queue:
+                try:
+                    gid = table[l][y][x]
+                    image, area = images[gid] or getImage(gid)
+                except IndexError:
+                    image, area = default
+                if image:
+                    blit(image, (x*tw-ltw, y * th-tth), area)
 
             self.queue = None
+            self.queued = 0
+            self.pending = []
+            self.statFlushes += 1
+            self.statFlushTime += clock() - start
 
 
     def redraw(self):
@@ -368,11 +876,21 @@ class BufferedTilemapRenderer(object):
         buffer.  will be slow, you've been warned.
         """
 
-        self.queue = product(xrange(self.view.left, self.view.right + 2),
-                             xrange(self.view.top, self.view.bottom + 2),
-                             xrange(len(self.tmx.visibleTileLayers)))
+        v = self.bufferView()
 
-        self.flushQueue()
+        if self.chunkSize:
+            self.queue = None
+            self.queued = 0
+            self.pending = []
+            self.blitChunks(pygame.Rect(v.left, v.top, v.width + 2,
+                                        v.height + 2))
+            return
+
+        self.queue = None
+        self.queued = 0
+        self.pending = []
+        self.blitTiles(self.buffer, pygame.Rect(v.left, v.top, v.width + 2,
+                                                v.height + 2))
 
 
     def toScreen(self, (x, y)):
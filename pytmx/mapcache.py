@@ -0,0 +1,196 @@
+"""
+Compiled cache for TMX maps.
+
+Parsing the xml of a large map is slow.  After a map is parsed, the TiledMap
+is saved next to it (map.tmx -> map.tmx.cache) and later loads read it back
+instead of parsing the map again.  Layer data is memory-mapped from the cache
+file, so it isn't read from disk until it is used.
+
+A cache is only used if the map, its external tilesets and its tileset
+images have not changed since it was made.  Files are checked by
+modification time first, then by their md5 hash if the time is different.
+
+Maps loaded from a cache always have numpy layers, and the layer data and
+tile index are read-only.  numpy is required; without it the cache is never used.
+
+File layout:
+    header (magic, version, length of pickle)
+    pickled (key, TiledMap without layer data, layer shapes, index length)
+    layer data as little-endian uint32, aligned to 8 bytes
+    tile index (TiledMap.tileindex) as little-endian uint32
+"""
+
+import os, struct, hashlib
+import cPickle as pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+
+# change this if the format or the pickled classes change
+VERSION = 6
+MAGIC = "PYTMXC"
+
+header = struct.Struct("<6sHQ")
+
+
+
+def cachePath(filename):
+    return filename + ".cache"
+
+
+def fileHash(path):
+    md5 = hashlib.md5()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), ""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def makeKey(tiledmap):
+    """
+    return a list of (path, mtime, md5) for the files a map was built from.
+
+    the tileset images are included, since the transparency of the tiles
+    (opaquegids) is kept in the cache.
+    """
+
+    dirname = os.path.dirname(tiledmap.filename)
+    images = [ os.path.join(dirname, t.source) for t in tiledmap.tilesets ]
+
+    paths = [tiledmap.filename] + list(tiledmap.external_files) + images
+    return [ (path, os.path.getmtime(path), fileHash(path)) for path in paths ]
+
+
+def checkKey(key):
+    """
+    return True if none of the files in a key have changed
+    """
+
+    for path, mtime, md5 in key:
+        try:
+            if os.path.getmtime(path) == mtime: continue
+            if fileHash(path) == md5: continue
+        except (IOError, OSError):
+            pass
+        return False
+
+    return True
+
+
+def load(filename):
+    """
+    return the TiledMap for a tmx file from its cache.
+
+    returns None if there is no cache, or it is out of date or can't be read.
+    """
+
+    if numpy is None: return None
+
+    path = cachePath(filename)
+    try:
+        with open(path, "rb") as fh:
+            magic, version, length = header.unpack(fh.read(header.size))
+            if not (magic == MAGIC and version == VERSION):
+                return None
+
+            key, tiledmap, shapes, indexsize = pickle.loads(fh.read(length))
+
+    except (IOError, OSError, struct.error, pickle.UnpicklingError,
+            EOFError, AttributeError, ImportError, ValueError):
+        return None
+
+    if not checkKey(key):
+        return None
+
+    offset = header.size + length
+    offset += -offset % 8
+
+    size = sum(h * w for h, w in shapes)
+    if size + indexsize:
+        data = numpy.memmap(path, dtype="<u4", mode="r", offset=offset,
+                            shape=(size + indexsize,))
+    else:
+        data = numpy.zeros(0, dtype="<u4")
+
+    i = 0
+    for layer, (h, w) in zip(tiledmap.tilelayers, shapes):
+        layer.data = data[i:i + h * w].reshape((h, w)).view(numpy.ndarray)
+        i += h * w
+
+    if tiledmap.tilelocations is not None:
+        tiledmap.tileindex = data[size:].view(numpy.ndarray)
+
+    tiledmap.filename = filename
+    return tiledmap
+
+
+def save(tiledmap):
+    """
+    write the cache for a TiledMap.  return True if it was written.
+
+    a map that can't be cached (for example, the folder is read-only) will
+    be silently skipped.
+    """
+
+    if numpy is None: return False
+
+    filename = tiledmap.filename
+    path = cachePath(filename)
+
+    layers = [ numpy.asarray(layer.data, dtype="<u4")
+               for layer in tiledmap.tilelayers ]
+    shapes = [ layer.shape for layer in layers ]
+
+    if tiledmap.tileindex is None:
+        index = numpy.zeros(0, dtype="<u4")
+    else:
+        index = numpy.asarray(tiledmap.tileindex, dtype="<u4")
+
+    # the layer data and index are written separately, so they can be
+    # memory-mapped
+    saved = [ layer.data for layer in tiledmap.tilelayers ]
+    images = tiledmap.images
+    tileindex = tiledmap.tileindex
+    tilestyles = tiledmap.tilestyles
+    try:
+        for layer in tiledmap.tilelayers:
+            layer.data = None
+        tiledmap.images = []
+        tiledmap.tileindex = None
+        tiledmap.tilestyles = None
+
+        try:
+            key = makeKey(tiledmap)
+        except (IOError, OSError):
+            return False
+
+        pickled = pickle.dumps((key, tiledmap, shapes, len(index)), -1)
+
+    finally:
+        for layer, data in zip(tiledmap.tilelayers, saved):
+            layer.data = data
+        tiledmap.images = images
+        tiledmap.tileindex = tileindex
+        tiledmap.tilestyles = tilestyles
+
+    offset = header.size + len(pickled)
+
+    try:
+        with open(path + ".temp", "wb") as fh:
+            fh.write(header.pack(MAGIC, VERSION, len(pickled)))
+            fh.write(pickled)
+            fh.write("\0" * (-offset % 8))
+            for layer in layers:
+                fh.write(layer.tostring())
+            fh.write(index.tostring())
+
+        os.rename(path + ".temp", path)
+
+    except (IOError, OSError):
+        return False
+
+    return True
@@ -45,7 +45,7 @@ class TiledMap(TiledElement):
     reserved = "version orientation width height tilewidth tileheight properties tileset layer objectgroup".split()
 
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, numpy_layers=False):
         from collections import defaultdict
 
         TiledElement.__init__(self)
@@ -54,6 +54,7 @@ class TiledMap(TiledElement):
         self.objectgroups = []      # list of TiledObjectGroup objects
         self.tile_properties = {}   # dict of tiles that have metadata
         self.filename = filename
+        self.external_files = []    # paths of external tilesets
 
         self.layernames = {}
 
@@ -76,6 +77,28 @@ class TiledMap(TiledElement):
         self.imagemap = {}  # mapping of gid and trans flags to real gids
         self.maxgid = 1
 
+        # if true, layer data is stored in 2d numpy arrays of uint32
+        self.numpy_layers = numpy_layers
+
+        # made by buildTileIndex() after the map is loaded
+        self.layergids = None       # set of the gids used in each layer
+        self.tilelocations = None   # gid -> locations of tiles with the gid
+
+        # for numpy layers, tilelocations has (start, end) in this array of
+        # the indexes of the tiles, sorted by gid
+        self.tileindex = None
+
+        # layers to draw, if some were merged by tmxloader.merge_layers_pygame
+        self.drawlayers = None
+
+        # set of gids of tiles with no transparent pixels, or None if it is
+        # not known.  filled in by the image loader, and kept in the cache
+        self.opaquegids = None
+
+        # gid -> (size, transparency) of each tile image.  filled in by the
+        # image loader, since it depends on how the images were converted
+        self.tilestyles = None
+
         if filename: self.load()
 
 
@@ -92,7 +115,10 @@ class TiledMap(TiledElement):
         """
 
         try:
-            gid = self.tilelayers[int(layer)].data[int(y)][int(x)]
+            if self.numpy_layers:
+                gid = self.tilelayers[int(layer)].data.item(int(y), int(x))
+            else:
+                gid = self.tilelayers[int(layer)].data[int(y)][int(x)]
         except (IndexError, ValueError):
             msg = "Coords: ({0},{1}) in layer {2} is not valid."
             raise Exception, msg.format(x, y, layer)
@@ -115,6 +141,8 @@ class TiledMap(TiledElement):
         """
 
         try:
+            if self.numpy_layers:
+                return self.tilelayers[int(layer)].data.item(int(y), int(x))
             return self.tilelayers[int(layer)].data[int(y)][int(x)]
         except (IndexError, ValueError):
             msg = "Coords: ({0},{1}) in layer {2} is invalid"
@@ -161,7 +189,10 @@ class TiledMap(TiledElement):
         """
 
         try:
-            gid = self.tilelayers[int(layer)].data[int(y)][int(x)]
+            if self.numpy_layers:
+                gid = self.tilelayers[int(layer)].data.item(int(y), int(x))
+            else:
+                gid = self.tilelayers[int(layer)].data[int(y)][int(x)]
         except (IndexError, ValueError):
             msg = "Coords: ({0},{1}) in layer {2} is invalid."
             raise Exception, msg.format(x, y, layer)
@@ -180,7 +211,8 @@ class TiledMap(TiledElement):
         """
         Return the data for a layer.
 
-        Data is an array of arrays.
+        Data is an array of arrays, or a 2d numpy array if the map was loaded
+        with numpy_layers.
 
         >>> pos = data[y][x]
         """
@@ -193,14 +225,113 @@ class TiledMap(TiledElement):
 
 
     def getTileLocation(self, gid):
-        # experimental way to find locations of a tile by the GID
+        """
+        return a list of (x, y, layer) for each tile with the GID.
+        the list is sorted by x, then y, then layer.
+        """
+
+        if self.tilelocations is None:
+            self.buildTileIndex()
 
-        p = product(xrange(self.width),
-                    xrange(self.height),
-                    xrange(len(self.tilelayers)))
+        if self.numpy_layers:
+            import numpy
 
-        return [ (x,y,l) for (x,y,l) in p
-               if self.tilelayers[l].data[y][x] == gid ]
+            if gid == 0:
+                # empty tiles are not indexed, since most tiles are empty
+                locations = numpy.flatnonzero(self.stackLayers() == 0)
+            else:
+                try:
+                    start, end = self.tilelocations[gid]
+                except KeyError:
+                    return []
+                locations = self.tileindex[start:end]
+
+            # locations are indexes into the layers stacked as [x][y][layer]
+            layers = len(self.tilelayers)
+            column = self.height * layers
+            return zip((locations // column).tolist(),
+                       (locations % column // layers).tolist(),
+                       (locations % layers).tolist())
+
+        try:
+            locations = self.tilelocations[gid]
+        except KeyError:
+            # empty tiles are not indexed
+            if gid == 0:
+                p = product(xrange(self.width),
+                            xrange(self.height),
+                            xrange(len(self.tilelayers)))
+
+                return [ (x,y,l) for (x,y,l) in p
+                       if self.tilelayers[l].data[y][x] == gid ]
+            return []
+
+        return list(locations)
+
+
+    def stackLayers(self):
+        """
+        return the gids of numpy layers as one flat array, in the order
+        [x][y][layer]
+        """
+        import numpy
+
+        layers = numpy.dstack([ layer.data for layer in self.tilelayers ])
+        return layers.transpose((1, 0, 2)).ravel()
+
+
+    def buildTileIndex(self):
+        """
+        make the tables that getTileLocation and getTilePropertiesByLayer
+        use, so they do not have to search the layers.
+
+        this is done when the map is loaded, and only needs to be called
+        again if the layer data is changed.
+        """
+
+        self.tileindex = None
+
+        if not self.tilelayers:
+            self.tilelocations = {}
+            self.layergids = []
+
+        elif self.numpy_layers:
+            import numpy
+
+            # empty tiles are left out.  a stable sort keeps tiles with the
+            # same gid in x, y, layer order
+            gids = self.stackLayers()
+            used = numpy.flatnonzero(gids)
+            gids = gids[used]
+            order = numpy.argsort(gids, kind="mergesort")
+            self.tileindex = used[order].astype(numpy.uint32)
+
+            unique, start = numpy.unique(gids[order], return_index=True)
+            end = start.tolist()[1:] + [len(order)]
+
+            self.tilelocations = dict(
+                zip(unique.tolist(), zip(start.tolist(), end)))
+
+            self.layergids = [ set(numpy.unique(layer.data).tolist())
+                               for layer in self.tilelayers ]
+
+        else:
+            self.tilelocations = defaultdict(list)
+            self.layergids = []
+            for l, layer in enumerate(self.tilelayers):
+                used = set()
+                for y, row in enumerate(layer.data):
+                    used.update(row)
+                    for x, gid in enumerate(row):
+                        if gid:
+                            self.tilelocations[gid].append((x, y, l))
+
+                self.layergids.append(used)
+
+            for locations in self.tilelocations.values():
+                locations.sort()
+
+            self.tilelocations = dict(self.tilelocations)
 
 
     def getTilePropertiesByGID(self, gid):
@@ -234,8 +365,14 @@ class TiledMap(TiledElement):
             msg = "Layer must be an integer.  Got {0} instead."
             raise ValueError, msg.format(type(layer))
 
-        p = product(range(self.width),range(self.height))
-        layergids = set( self.tilelayers[layer].data[y][x] for x, y in p )
+        if self.layergids is None:
+            self.buildTileIndex()
+
+        try:
+            layergids = self.layergids[layer]
+        except IndexError:
+            msg = "Layer {0} does not exist."
+            raise ValueError, msg.format(layer)
 
         props = []
         for gid in layergids:
@@ -271,6 +408,25 @@ class TiledMap(TiledElement):
             return 0
 
 
+    def registerGIDArray(self, raw_gids):
+        """
+        register all the GIDs in a numpy array of GIDs from the tmx data.
+
+        returns a new uint32 array of the gids used internally.  the GIDs are
+        registered in the order they are first found in the array, so they
+        are the same as they would be if registerGID was called on each one.
+        """
+        import numpy
+
+        unique, first, inverse = numpy.unique(raw_gids, return_index=True,
+                                              return_inverse=True)
+
+        lut = numpy.zeros(len(unique), dtype=numpy.uint32)
+        for i in numpy.argsort(first, kind="mergesort"):
+            lut[i] = self.registerGID(*decode_gid(int(unique[i])))
+
+        return lut[inverse]
+
 
     def mapGID(self, real_gid):
         """
@@ -293,15 +449,45 @@ class TiledMap(TiledElement):
     def load(self):
         """
         parse a map node from a tiled tmx file
+
+        the file is read as a stream, and each layer is decoded and removed
+        from the tree as soon as it has been read, so the xml of the layers
+        is never all in memory at once.  tiles of xml encoded layers are
+        dropped as they are read, too.
         """
-        etree = ElementTree.parse(self.filename).getroot()
-        self.set_properties(etree)
+        import array
 
         # initialize the gid mapping
         self.imagemap[(0,0)] = 0
 
-        for node in etree.findall('layer'):
-            self.addTileLayer(TiledLayer(self, node))
+        etree = None
+        layer = None        # layer node being read
+        data = None         # data node of that layer, if its tiles are xml
+        gids = None         # gids of the xml tiles read so far
+
+        for event, node in ElementTree.iterparse(self.filename,
+                                                 ("start", "end")):
+            if event == "start":
+                if etree is None:
+                    etree = node
+                elif layer is None:
+                    if node.tag == "layer":
+                        layer = node
+                elif (node.tag == "data" and
+                      node.get("encoding", None) is None):
+                    data = node
+                    gids = array.array("L")
+
+            elif node is layer:
+                self.addTileLayer(TiledLayer(self, node, gids))
+                etree.remove(node)
+                layer = data = gids = None
+
+            elif data is not None and node.tag == "tile":
+                gids.append(int(node.get("gid")))
+                data.remove(node)
+
+        self.set_properties(etree)
 
         for node in etree.findall('objectgroup'):
             self.objectgroups.append(TiledObjectGroup(self, node))
@@ -317,6 +503,8 @@ class TiledMap(TiledElement):
                 o.name = "TileObject"
                 o.__dict__.update(p)
 
+        self.buildTileIndex()
+
 
     def addTileLayer(self, layer):
         """
@@ -330,6 +518,11 @@ class TiledMap(TiledElement):
         self.tilelayers.append(layer)
         self.layernames[layer.name] = layer
 
+        # the index will be made again when it is needed
+        self.layergids = None
+        self.tilelocations = None
+        self.tileindex = None
+
 
     def getTileLayerByName(self, name):
         """
@@ -415,6 +608,8 @@ class TiledTileset(TiledElement):
                     msg = "Cannot load external tileset: {0}"
                     raise Exception, msg.format(path)
 
+                self.parent.external_files.append(path)
+
             else:
                 msg = "Found external tileset, but cannot handle type: {0}"
                 raise Exception, msg.format(self.source)
@@ -440,7 +635,7 @@ class TiledTileset(TiledElement):
 class TiledLayer(TiledElement):
     reserved = "name x y width height opacity properties data".split()
 
-    def __init__(self, parent, node):
+    def __init__(self, parent, node, gids=None):
         TiledElement.__init__(self)
         self.parent = parent
         self.data = []
@@ -450,16 +645,17 @@ class TiledLayer(TiledElement):
         self.opacity = 1.0
         self.visible = True
 
-        self.parse(node)
+        self.parse(node, gids)
 
 
     def __repr__(self):
         return "<{0}: \"{1}\">".format(self.__class__.__name__, self.name)
 
 
-    def parse(self, node):
+    def parse(self, node, gids=None):
         """
-        parse a layer element
+        parse a layer element.  gids of a layer with xml tiles can be passed
+        if they were already read from the tile nodes.
         """
         from utils import group
         from itertools import product, imap
@@ -479,9 +675,9 @@ class TiledLayer(TiledElement):
             data = decodestring(data_node.text.strip())
 
         elif encoding == "csv":
-            next_gid = imap(int, "".join(
-                line.strip() for line in data_node.text.strip()
-                ).split(","))
+            # a row at a time, so all the gids are not strings at once
+            next_gid = (int(gid) for row in data_node.text.split()
+                        for gid in row.split(",") if gid)
 
         elif encoding:
             msg = "TMX encoding type: {0} is not supported."
@@ -511,9 +707,16 @@ class TiledLayer(TiledElement):
                 for child in parent.findall('tile'):
                     yield int(child.get('gid'))
 
-            next_gid = get_children(data_node)
+            if gids is None:
+                next_gid = get_children(data_node)
+            else:
+                next_gid = iter(gids)
+
+        if self.parent.numpy_layers:
+            self.data = self.parseArray(data, next_gid)
+            return
 
-        elif data:
+        if data:
             # data is a list of gids. cast as 32-bit ints to format properly
             # create iterator to efficiently parse data
             next_gid=imap(lambda i:unpack("<L", "".join(i))[0], group(data, 4))
@@ -527,6 +730,48 @@ class TiledLayer(TiledElement):
             self.data[y].append(self.parent.registerGID(*decode_gid(next(next_gid))))
 
 
+    def parseArray(self, data, next_gid):
+        """
+        return the layer as a 2d numpy array of gids.
+
+        decoded data is read with one call, rather than one gid at a time.
+        """
+        import numpy
+
+        size = self.width * self.height
+        if data:
+            raw = numpy.frombuffer(data, dtype="<u4", count=size)
+        else:
+            raw = numpy.fromiter(next_gid, dtype=numpy.uint32, count=size)
+
+        gids = self.parent.registerGIDArray(raw)
+        return gids.reshape((self.height, self.width))
+
+
+class TiledMergedLayer(object):
+    """
+    Consecutive tile layers collapsed into one layer for drawing.
+    Made by tmxloader.merge_layers_pygame.
+
+    Each tile is the stack of tiles from the layers, so it does not have
+    any tile properties.  Use the original layers for those.
+    """
+
+    def __init__(self, parent, layers, data):
+        self.parent = parent
+        self.layers = layers    # the merged TiledLayers, lowest first
+        self.data = data
+        self.name = "+".join(layer.name for layer in layers)
+        self.width = parent.width
+        self.height = parent.height
+        self.opacity = 1.0
+        self.visible = True
+
+
+    def __repr__(self):
+        return "<{0}: \"{1}\">".format(self.__class__.__name__, self.name)
+
+
 class TiledObjectGroup(TiledElement, list):
     """
     Stores TiledObjects.  Supports any operation of a normal list.
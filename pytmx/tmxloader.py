@@ -114,6 +114,32 @@ Basic usage sample:
 The loader will correctly convert() or convert_alpha() each tile image, so you
 don't have to worry about that after you load the map.
 
+Large maps load much faster if the layers are stored in numpy arrays.  This
+also removes the limit of 256 unique tiles per layer.  numpy must be installed.
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", numpy_layers=True)
+
+Maps can also be cached in a compiled form next to the tmx file, so the xml
+only has to be parsed again if the map changes.  See mapcache.py.
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", cache=True)
+
+Tiles can be converted the first time they are used, rather than when the map
+is loaded.  The rest of the tiles can be converted in a background thread.
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", lazy_images=True)
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", lazy_images=True,
+    ...                                 warm_images=True)
+
+Layers that are always drawn together can be merged into one layer for
+drawing.  Each stack of tiles becomes a new tile, so a renderer only has to
+blit one.  The original layers are kept, and the layers to draw are put in
+"drawlayers".  See merge_layers_pygame.
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", merge_layers=True)
+    >>> tmxdata = tmxloader.load_pygame("map.tmx",
+    ...                                 merge_layers=[("Ground", "Walls")])
+
 
 When you want to draw tiles, you simply call "getTileImage":
 
@@ -180,29 +206,55 @@ from constants import *
 def load_tmx(filename, *args, **kwargs):
     # for .14 compatibility
     from pytmx import TiledMap
+    import mapcache
+
+    if kwargs.get("cache", False) and mapcache.numpy:
+        tiledmap = mapcache.load(filename)
+        if tiledmap is None:
+            tiledmap = TiledMap(filename, True)
 
-    tiledmap = TiledMap(filename)
+            # load_pygame saves the map once its images are loaded, so the
+            # transparency of the tiles is saved with it
+            if kwargs.get("save_cache", True):
+                mapcache.save(tiledmap)
+        return tiledmap
+
+    tiledmap = TiledMap(filename, kwargs.get("numpy_layers", False))
     return tiledmap
 
 
 
-def pygame_convert(original, colorkey, force_colorkey, pixelalpha):
+def pygame_opaque(original):
+    """
+    return True if a surface has no transparent pixels
+    """
+    from pygame import mask
+
+    w, h = original.get_size()
+    return mask.from_surface(original).count() == w * h
+
+
+def pygame_convert(original, colorkey, force_colorkey, pixelalpha,
+                   opaque=None):
     """
     this method does several tests on a surface to determine the optimal
     flags and pixel format for each tile.
 
     this is done for the best rendering speeds and removes the need to
     convert() the images on your own
+
+    if it is already known if the surface has transparent pixels, pass it as
+    opaque so the surface doesn't have to be checked again.
     """
-    from pygame import Surface, mask, RLEACCEL
+    from pygame import Surface, RLEACCEL
 
     tile_size = original.get_size()
 
-    # count the number of pixels in the tile that are not transparent
-    px = mask.from_surface(original).count()
+    if opaque is None:
+        opaque = pygame_opaque(original)
 
     # there are no transparent pixels in the image
-    if px == tile_size[0] * tile_size[1]:
+    if opaque:
         tile = original.convert()
 
     # there are transparent pixels, and set to force a colorkey
@@ -228,6 +280,236 @@ def pygame_convert(original, colorkey, force_colorkey, pixelalpha):
     return tile
 
 
+def pygame_transparency(colorkey, force_colorkey, pixelalpha, opaque):
+    """
+    return the transparency of a tile that pygame_convert makes with these
+    arguments, without converting it: None if it is drawn without any, its
+    colorkey, or True for per-pixel alpha.  see pygame_merge_plan.
+    """
+
+    if opaque:
+        return None
+    elif force_colorkey:
+        return tuple(force_colorkey)
+    elif colorkey:
+        return tuple(colorkey)
+    elif pixelalpha:
+        return True
+    else:
+        return None
+
+
+def handle_transformation(tile, flags):
+    """
+    return a tile flipped and rotated by the tiled transformation flags
+    """
+    import pygame
+
+    if flags:
+        fx = flags & TRANS_FLIPX == TRANS_FLIPX
+        fy = flags & TRANS_FLIPY == TRANS_FLIPY
+        r  = flags & TRANS_ROT == TRANS_ROT
+
+        if r:
+            # not sure why the flip is required...but it is.
+            newtile = pygame.transform.rotate(tile, 270)
+            newtile = pygame.transform.flip(newtile, 1, 0)
+
+            if fx or fy:
+                newtile = pygame.transform.flip(newtile, fx, fy)
+
+        elif fx or fy:
+            newtile = pygame.transform.flip(tile, fx, fy)
+
+        # preserve any flags that may have been lost after the transformation
+        return newtile.convert(tile)
+
+    else:
+        return tile
+
+
+def tile_positions((w, h), tilewidth, tileheight, margin, spacing):
+    """
+    return a list of the (x, y) of each tile in a tileset image, in the
+    order of their gids
+    """
+
+    # i dont agree with margins and spacing, but i'll support it anyway
+    # such is life.  okay.jpg
+    tilewidth += spacing
+    tileheight += spacing
+
+    # some tileset images may be slightly larger than the tile area
+    # ie: may include a banner, copyright, ect.  this compensates for that
+    width = ((int((w-margin*2) + spacing) / tilewidth) * tilewidth) - spacing
+    height = ((int((h-margin*2) + spacing) / tileheight) * tileheight) - spacing
+
+    return [ (x, y) for y in xrange(margin, height+margin, tileheight)
+                    for x in xrange(margin, width+margin, tilewidth) ]
+
+
+def pygame_load_tileset(job):
+    """
+    load a tileset image, and find which of the tiles used by the map have
+    no transparent pixels.
+
+    the job is (path, tile size, margin, spacing, ids of the tiles used, or
+    None to skip checking them).  returns the image, and the set of ids of
+    the opaque tiles.
+    """
+    import pygame
+
+    path, (tilewidth, tileheight), margin, spacing, used = job
+    image = pygame.image.load(path)
+
+    opaque = None
+    if used is not None:
+        positions = tile_positions(image.get_size(), tilewidth, tileheight,
+                                   margin, spacing)
+
+        tile_size = (tilewidth, tileheight)
+        opaque = set(i for i in used if i < len(positions) and
+                     pygame_opaque(image.subsurface((positions[i], tile_size))))
+
+    return image, opaque
+
+
+def pygame_decode_tileset(job):
+    """
+    pygame_load_tileset for a pool of threads or processes.  the image is
+    returned as plain data, so it can be sent back from another process:
+    the pixels as a string, and (size, format, colorkey, opaque tile ids).
+    """
+    import pygame
+
+    image, opaque = pygame_load_tileset(job)
+
+    if image.get_masks()[3]:
+        format = "RGBA"
+    else:
+        format = "RGB"
+
+    colorkey = image.get_colorkey()
+    if colorkey:
+        colorkey = tuple(colorkey)
+
+    info = (image.get_size(), format, colorkey, opaque)
+    return pygame.image.tostring(image, format), info
+
+
+class TileImages(object):
+    """
+    List of tile images that are converted the first time they are used.
+    Made by load_images_pygame with "lazy_images=True".
+
+    Until a tile is used, only its area of the tileset image is kept.  Tiles
+    that are made from other tiles, like merged stacks, are made the first
+    time they are used, too.  See setLoader.  warm() converts the rest of the
+    tiles, and can be run in a thread while the map is already being drawn.
+    """
+
+    def __init__(self, size, convert):
+        import threading
+
+        self.images = [0] * size
+        self.sources = {}           # gid -> (function, arguments)
+        self.convert = convert
+        self.lock = threading.RLock()   # loaders may use other tiles
+        self.thread = None
+
+
+    def __len__(self):
+        return len(self.images)
+
+
+    def __getitem__(self, gid):
+        image = self.images[gid]
+        if image is None:
+            image = self.load(gid)
+        return image
+
+
+    def __setitem__(self, gid, image):
+        with self.lock:
+            if gid < 0: gid += len(self.images)
+            self.sources.pop(gid, None)
+            self.images[gid] = image
+
+
+    def __iter__(self):
+        for gid in xrange(len(self.images)):
+            yield self[gid]
+
+
+    def append(self, image):
+        self.images.append(image)
+
+
+    def setSource(self, gid, *args):
+        """
+        set the arguments used to convert the tile when it is used
+        """
+
+        self.setLoader(gid, self.convert, *args)
+
+
+    def setLoader(self, gid, load, *args):
+        """
+        set a function that makes the tile when it is used
+        """
+
+        self.images[gid] = None
+        self.sources[gid] = (load, args)
+
+
+    def load(self, gid):
+        """
+        convert a tile, if it has not been converted yet, and return it
+        """
+
+        with self.lock:
+            if gid < 0: gid += len(self.images)
+            image = self.images[gid]
+            if image is None:
+                load, args = self.sources.pop(gid)
+                image = load(*args)
+                self.images[gid] = image
+
+        return image
+
+
+    @property
+    def pending(self):
+        """
+        number of tiles that have not been converted yet
+        """
+
+        return len(self.sources)
+
+
+    def warm(self):
+        """
+        convert all of the tiles that have not been used yet
+        """
+
+        for gid in self.sources.keys():
+            self.load(gid)
+
+
+    def warmInBackground(self):
+        """
+        start a thread that converts the tiles that have not been used yet
+        """
+        import threading
+
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.warm)
+            self.thread.daemon = True
+            self.thread.start()
+
+        return self.thread
+
+
 def load_images_pygame(tmxdata, mapping, *args, **kwargs):
     """
     due to the way the tiles are loaded, they will be in the same pixel format
@@ -250,43 +532,34 @@ def load_images_pygame(tmxdata, mapping, *args, **kwargs):
     transparency (which you shouldn't be doing anyway, this is SDL).
 
 
+    with "lazy_images=True", tiles are not converted until they are used.
+    tmxdata.images will be a TileImages, which can be used like a list.
+
+    the tiles that have no transparent pixels are found when the images are
+    first loaded.  if the map was loaded by load_pygame with "cache=True",
+    this is saved in the cache, so the tiles don't have to be checked again.
+
+    maps with many tilesets can decode them in parallel.  pass "workers=n"
+    to use a pool of n threads, or a pool of your own (such as
+    multiprocessing.Pool) as "pool".  the pool decodes the images and checks
+    the tiles for transparency, and the surfaces are made in this thread.
+
     TL;DR:
     Don't attempt to convert() or convert_alpha() the individual tiles.  It is
     already done for you.
 
     """
-    from itertools import product
+    from bisect import bisect_right
     from pygame import Surface
     import pygame, os
 
 
-    def handle_transformation(tile, flags):
-        if flags:
-            fx = flags & TRANS_FLIPX == TRANS_FLIPX
-            fy = flags & TRANS_FLIPY == TRANS_FLIPY
-            r  = flags & TRANS_ROT == TRANS_ROT
-
-            if r:
-                # not sure why the flip is required...but it is.
-                newtile = pygame.transform.rotate(tile, 270)
-                newtile = pygame.transform.flip(newtile, 1, 0)
-
-                if fx or fy:
-                    newtile = pygame.transform.flip(newtile, fx, fy)
-
-            elif fx or fy:
-                newtile = pygame.transform.flip(tile, fx, fy)
-
-            # preserve any flags that may have been lost after the transformation
-            return newtile.convert(tile)
-
-        else:
-            return tile
-
-
     pixelalpha     = kwargs.get("pixelalpha", False)
     force_colorkey = kwargs.get("force_colorkey", False)
     force_bitdepth = kwargs.get("depth", False)
+    lazy           = kwargs.get("lazy_images", False)
+    pool           = kwargs.get("pool", None)
+    workers        = kwargs.get("workers", 0)
 
     if force_colorkey:
         try:
@@ -295,14 +568,72 @@ def load_images_pygame(tmxdata, mapping, *args, **kwargs):
             msg = "Cannot understand color: {0}"
             raise Exception, msg.format(force_colorkey)
 
-    tmxdata.images = [0] * tmxdata.maxgid
+    def load_tile(original, flags, colorkey, opaque):
+        tile = handle_transformation(original, flags)
+        return pygame_convert(tile, colorkey, force_colorkey, pixelalpha,
+                              opaque)
 
-    for firstgid, t in sorted((t.firstgid, t) for t in tmxdata.tilesets):
-        path = os.path.join(os.path.dirname(tmxdata.filename), t.source)
+    if lazy:
+        tmxdata.images = TileImages(tmxdata.maxgid, load_tile)
+    else:
+        tmxdata.images = [0] * tmxdata.maxgid
+
+    # (size, transparency) of each tile, so layers can be merged without
+    # looking at the images.  see pygame_merge_plan.
+    tmxdata.tilestyles = {}
+
+    # gids of the tiles that have no transparent pixels, if they are known
+    opaque = getattr(tmxdata, "opaquegids", None)
+    classify = opaque is None
+    if classify:
+        opaque = set()
+
+    tilesets = [ t for firstgid, t in
+                 sorted((t.firstgid, t) for t in tmxdata.tilesets) ]
+
+    if pool is None and workers > 1 and len(tilesets) > 1:
+        from multiprocessing.pool import ThreadPool
+        decoder = ThreadPool(min(workers, len(tilesets)))
+    else:
+        decoder = pool
 
-        image = pygame.image.load(path)
+    if decoder is None:
+        # tiles are checked for transparency as they are cut out below
+        loaded = []
+        for t in tilesets:
+            path = os.path.join(os.path.dirname(tmxdata.filename), t.source)
+            loaded.append((pygame.image.load(path), None))
 
-        w, h = image.get_size()
+    else:
+        # the ids in each tileset of the tiles that are used by the map
+        used = [ [] for t in tilesets ]
+        firstgids = [ t.firstgid for t in tilesets ]
+        for real_gid, gids in tmxdata.gidmap.iteritems():
+            if gids:
+                i = bisect_right(firstgids, real_gid) - 1
+                used[i].append(real_gid - firstgids[i])
+
+        jobs = []
+        for t, ids in zip(tilesets, used):
+            path = os.path.join(os.path.dirname(tmxdata.filename), t.source)
+            jobs.append((path, (t.tilewidth, t.tileheight), t.margin,
+                         t.spacing, sorted(ids) if classify else None))
+
+        try:
+            decoded = decoder.map(pygame_decode_tileset, jobs)
+        finally:
+            if decoder is not pool:
+                decoder.close()
+
+        # surfaces are only made in this thread
+        loaded = []
+        for pixels, (size, format, colorkey, tile_opaque) in decoded:
+            image = pygame.image.fromstring(pixels, size, format)
+            if colorkey:
+                image.set_colorkey(colorkey)
+            loaded.append((image, tile_opaque))
+
+    for t, (image, tile_opaque) in zip(tilesets, loaded):
         tile_size = (t.tilewidth, t.tileheight)
         real_gid = t.firstgid - 1
 
@@ -310,37 +641,295 @@ def load_images_pygame(tmxdata, mapping, *args, **kwargs):
         if t.trans:
             colorkey = pygame.Color("#{0}".format(t.trans))
 
-        # i dont agree with margins and spacing, but i'll support it anyway
-        # such is life.  okay.jpg
-        tilewidth = t.tilewidth + t.spacing
-        tileheight = t.tileheight + t.spacing
-
-        # some tileset images may be slightly larger than the tile area
-        # ie: may include a banner, copyright, ect.  this compensates for that
-        width = ((int((w-t.margin*2) + t.spacing) / tilewidth) * tilewidth) - t.spacing
-        height = ((int((h-t.margin*2) + t.spacing) / tileheight) * tileheight) - t.spacing
-
-        # using product avoids the overhead of nested loops
-        p = product(xrange(t.margin, height+t.margin, tileheight),
-                    xrange(t.margin, width+t.margin, tilewidth))
+        positions = tile_positions(image.get_size(), t.tilewidth,
+                                   t.tileheight, t.margin, t.spacing)
 
-        for (y, x) in p:
+        for i, (x, y) in enumerate(positions):
             real_gid += 1
             gids = tmxdata.mapGID(real_gid)
             if gids == []: continue
 
             original = image.subsurface(((x,y), tile_size))
 
+            # flipping and rotating a tile doesn't change its transparency
+            if classify:
+                if tile_opaque is None:
+                    is_opaque = pygame_opaque(original)
+                else:
+                    is_opaque = i in tile_opaque
+                if is_opaque:
+                    opaque.update(gid for gid, flags in gids)
+
             for gid, flags in gids:
-                tile = handle_transformation(original, flags)
-                tile = pygame_convert(tile, colorkey, force_colorkey, pixelalpha)
-                tmxdata.images[gid] = tile
+                args = (original, flags, colorkey, gid in opaque)
+                tmxdata.tilestyles[gid] = (tile_size, pygame_transparency(
+                    colorkey, force_colorkey, pixelalpha, gid in opaque))
+                if lazy:
+                    tmxdata.images.setSource(gid, *args)
+                else:
+                    tmxdata.images[gid] = load_tile(*args)
+
+    tmxdata.opaquegids = opaque
+
+
+def pygame_style(tile):
+    """
+    return (shape, transparency) of a surface, for pygame_merge_plan
+    """
+    from pygame import SRCALPHA
+
+    if tile.get_alpha() or tile.get_flags() & SRCALPHA:
+        transparency = True
+    elif tile.get_colorkey():
+        transparency = tuple(tile.get_colorkey())
+    else:
+        transparency = None
+
+    shape = (tile.get_size(), tile.get_bitsize(), tile.get_masks())
+    return shape, transparency
+
+
+def pygame_merge_plan(styles):
+    """
+    return (start, exact) for a stack of tiles, lowest first, from the
+    (shape, transparency) of each tile.  transparency is None if the tile
+    is drawn without any, its colorkey, or True for per-pixel alpha.
+
+    tiles below start are covered by a tile with no transparency, so they
+    are never seen.  exact is True if the rest can be merged into one tile
+    that looks the same: they have the same shape, and the same colorkey
+    transparency (or none).
+    """
+
+    start = 0
+    for i in xrange(len(styles) - 1, 0, -1):
+        if styles[i][1] is None:
+            start = i
+            break
+
+    styles = styles[start:]
+    if len(styles) < 2:
+        return start, True
+
+    shape, colorkey = styles[0]
+    for other, transparency in styles:
+        if transparency is True or other != shape:
+            return start, False
+        if transparency and transparency != colorkey:
+            if colorkey: return start, False
+            colorkey = transparency
+
+    return start, True
+
+
+def pygame_merge(images):
+    """
+    return a list with fewer images that looks the same when blitted as the
+    list of images passed, if one can be made.
+
+    tiles below a tile with no transparency are dropped, and tiles that have
+    the same pixel format and colorkey (or no) transparency are blitted onto
+    one new surface.  tiles with alpha transparency are not merged.  see
+    pygame_merge_plan.
+    """
+    from pygame import Surface, mask, RLEACCEL
+
+    start, exact = pygame_merge_plan([ pygame_style(i) for i in images ])
+    images = images[start:]
+    if len(images) < 2 or not exact:
+        return list(images)
+
+    first = images[0]
+    colorkey = first.get_colorkey()
+    for tile in images:
+        if tile.get_colorkey() and not colorkey:
+            colorkey = tile.get_colorkey()
+
+    merged = Surface(first.get_size(), 0, first)
+    if colorkey:
+        merged.fill(colorkey)
+    for tile in images:
+        merged.blit(tile, (0, 0))
+
+    if first.get_colorkey():
+        merged.set_colorkey(colorkey, RLEACCEL)
+
+        # a pixel of a tile may be the same color as the colorkey
+        covered = mask.Mask(first.get_size())
+        for tile in images:
+            covered.draw(mask.from_surface(tile), (0, 0))
+        if mask.from_surface(merged).count() != covered.count():
+            return list(images)
+
+    return [ merged ]
+
+
+def merge_layers_pygame(tmxdata, groups):
+    """
+    collapse groups of consecutive visible tile layers into single layers, so
+    that a renderer blits one tile where it would have blitted a stack.
+
+    groups is a list of lists of layer names or indexes, or True to merge
+    all of the visible layers.  each stack of tiles in a group is given a new
+    GID, and identical stacks share the GID.  the new images are made with
+    pygame_merge, so they look the same as the stack when it is blitted.
+    which stacks can be merged is found from tmxdata.tilestyles, so the
+    images are only used to make the new tiles.  if the images are
+    TileImages, the new tiles are made the first time they are used.
+
+    stacks that cannot be merged exactly (for example, tiles with alpha
+    transparency) are left in their layers.  the merged layer has no tile
+    there, and is followed by a layer for each layer of the group, with
+    only the tiles of those stacks.
+
+    the tile layers are not changed, so tile properties and layer indexes
+    work as before.  the layers to draw, in order, are put in
+    tmxdata.drawlayers: a TiledMergedLayer for each group, and the visible
+    layers that are not in a group.
+    """
+    from pytmx import TiledMergedLayer
+    from itertools import izip
+    import array
+
+    if tmxdata.numpy_layers:
+        import numpy
+
+    visible = tmxdata.visibleTileLayers
+
+    if groups is True:
+        groups = [ visible ]
+
+    # find the layers of each group, and check that they can be merged
+    merged = {}
+    for group in groups:
+        layers = []
+        for layer in group:
+            if isinstance(layer, int):
+                layer = tmxdata.tilelayers[layer]
+            elif not hasattr(layer, "data"):
+                layer = tmxdata.getTileLayerByName(layer)
+            layers.append(layer)
+
+        try:
+            first = visible.index(layers[0])
+        except ValueError:
+            msg = "Layer \"{0}\" is not visible, so cannot be merged."
+            raise ValueError, msg.format(layers[0].name)
+
+        if visible[first:first + len(layers)] != layers:
+            msg = "Layers must be visible and consecutive to be merged: {0}"
+            raise ValueError, msg.format([ l.name for l in layers ])
+
+        for other, others in merged.items():
+            if first < other + len(others) and other < first + len(layers):
+                msg = "Layers cannot be in more than one group: {0}"
+                raise ValueError, msg.format([ l.name for l in layers ])
+
+        merged[first] = layers
+
+    images = tmxdata.images
+    styles = tmxdata.tilestyles
+    stacks = {}     # tuple of gids -> gid of the merged tile, or None
+
+    def mergeStack(stack):
+        return pygame_merge([ images[i] for i in stack ])[0]
+
+    def stackGID(stack):
+        stack = tuple(gid for gid in stack if gid)
+        if len(stack) < 2:
+            return stack[0] if stack else 0
+
+        try:
+            return stacks[stack]
+        except KeyError:
+            pass
+
+        if styles is None:
+            plan = [ pygame_style(images[gid]) for gid in stack ]
+        else:
+            plan = [ styles[gid] for gid in stack ]
+        start, exact = pygame_merge_plan(plan)
+
+        if not exact:
+            gid = None
+        elif start == len(stack) - 1:
+            gid = stack[start]
+        else:
+            gid = len(images)
+            if isinstance(images, TileImages):
+                images.append(None)
+                images.setLoader(gid, mergeStack, stack)
+            else:
+                images.append(mergeStack(stack))
+
+        stacks[stack] = gid
+        return gid
+
+    drawlayers = []
+    i = 0
+    while i < len(visible):
+        if i not in merged:
+            drawlayers.append(visible[i])
+            i += 1
+            continue
+
+        layers = merged[i]
+        rows = [ l.data.tolist() if tmxdata.numpy_layers else l.data
+                 for l in layers ]
+
+        data = []
+        separate = []   # (x, y) of the stacks left in their layers
+        for y, row in enumerate(izip(*rows)):
+            gids = map(stackGID, izip(*row))
+            if None in gids:
+                for x, gid in enumerate(gids):
+                    if gid is None:
+                        separate.append((x, y))
+                        gids[x] = 0
+            data.append(array.array("L", gids))
+
+        if tmxdata.numpy_layers:
+            data = numpy.array(data, dtype=numpy.uint32)
+
+        drawlayers.append(TiledMergedLayer(tmxdata, layers, data))
+
+        if separate:
+            for layer in layers:
+                if tmxdata.numpy_layers:
+                    rest = numpy.zeros(layer.data.shape, dtype=numpy.uint32)
+                else:
+                    rest = [ array.array("L", [0] * len(row))
+                             for row in layer.data ]
+                for x, y in separate:
+                    rest[y][x] = layer.data[y][x]
+                drawlayers.append(TiledMergedLayer(tmxdata, [layer], rest))
+
+        i += len(layers)
+
+    tmxdata.maxgid = len(images)
+    tmxdata.drawlayers = drawlayers
 
 
 def load_pygame(filename, *args, **kwargs):
-    tmxdata = load_tmx(filename, *args, **kwargs)
+    import mapcache
+
+    # the cache is saved here, after the tiles have been checked for
+    # transparency, so a new cache is only written once
+    options = dict(kwargs, save_cache=False)
+    tmxdata = load_tmx(filename, *args, **options)
+    classify = tmxdata.opaquegids is None
     load_images_pygame(tmxdata, None, *args, **kwargs)
 
+    if classify and kwargs.get("cache", False):
+        mapcache.save(tmxdata)
+
+    merge = kwargs.get("merge_layers", False)
+    if merge:
+        merge_layers_pygame(tmxdata, merge)
+
+    if kwargs.get("warm_images", False) and hasattr(tmxdata.images, "warm"):
+        tmxdata.images.warmInBackground()
+
     return tmxdata
 
 
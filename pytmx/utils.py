@@ -3,6 +3,11 @@ from itertools import tee, islice, izip, product
 from collections import defaultdict
 from constants import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 
 """
@@ -144,7 +149,7 @@ def buildDistributionRects(tmxmap, layer, tileset=None, real_gid=None):
 
 
     if isinstance(layer, int):
-        layer_data = tmxmap.getLayerData(layer).data
+        layer_data = tmxmap.getLayerData(layer)
     elif isinstance(layer, str):
         try:
             layer = [ l for l in tmxmap.tilelayers if l.name == layer ].pop()
@@ -153,6 +158,14 @@ def buildDistributionRects(tmxmap, layer, tileset=None, real_gid=None):
             msg = "Layer \"{0}\" not found in map {1}."
             raise ValueError, msg.format(layer, tmxmap)
 
+    if numpy:
+        layer_data = numpy.asarray(layer_data)
+        if gid:
+            mask = layer_data == gid
+        else:
+            mask = layer_data != 0
+        return simplify_mask(mask, tmxmap.tilewidth, tmxmap.tileheight)
+
     p = product(xrange(tmxmap.width), xrange(tmxmap.height))
     if gid:
         points = [ (x,y) for (x,y) in p if layer_data[y][x] == gid ]
@@ -164,6 +177,78 @@ def buildDistributionRects(tmxmap, layer, tileset=None, real_gid=None):
 
 
 def simplify(all_points, tilewidth, tileheight):
+    """
+    turn a list of (x, y) tile points into rects.
+
+    uses simplify_mask if numpy is available, otherwise simplify_points.
+    """
+
+    if numpy and all_points:
+        width = max(x for x, y in all_points) + 1
+        height = max(y for x, y in all_points) + 1
+        mask = numpy.zeros((height, width), dtype=bool)
+        x, y = zip(*all_points)
+        mask[list(y), list(x)] = True
+        return simplify_mask(mask, tilewidth, tileheight)
+
+    return simplify_points(list(all_points), tilewidth, tileheight)
+
+
+def simplify_mask(mask, tilewidth, tileheight):
+    """
+    turn a 2d boolean array (mask[y][x]) into a list of rects that cover all
+    of the true tiles.  the rects do not overlap.
+
+    this runs in time linear to the size of the mask.  each row is split into
+    runs of true tiles, and each run is made into a rect that is grown down
+    for as long as every tile under it is true.  the same is done for the
+    columns, and whichever gives fewer rects is used.
+    """
+
+    mask = numpy.asarray(mask, dtype=bool)
+    if mask.ndim != 2 or not mask.any():
+        return []
+
+    rows = merge_runs(mask)
+    columns = [ (x, y, w, h) for (y, x, h, w) in merge_runs(mask.T) ]
+    if len(columns) < len(rows):
+        rows = columns
+
+    return [ Rect(x*tilewidth, y*tileheight, w*tilewidth, h*tileheight)
+             for (x, y, w, h) in rows ]
+
+
+def merge_runs(mask):
+    """
+    return a list of (x, y, width, height) tuples that cover a 2d boolean
+    array.  see simplify_mask.
+    """
+
+    mask = mask.copy()
+    height, width = mask.shape
+    padded = numpy.zeros(width + 2, dtype=numpy.int8)
+    rects = []
+
+    for y in xrange(height):
+        row = mask[y]
+        if not row.any(): continue
+
+        # runs start and end where the padded row changes value
+        padded[1:-1] = row
+        edges = numpy.flatnonzero(numpy.diff(padded)).tolist()
+
+        for x1, x2 in zip(edges[::2], edges[1::2]):
+            y2 = y + 1
+            while y2 < height and mask[y2, x1:x2].all():
+                y2 += 1
+
+            mask[y:y2, x1:x2] = False
+            rects.append((x1, y, x2 - x1, y2 - y))
+
+    return rects
+
+
+def simplify_points(all_points, tilewidth, tileheight):
     """
     kludge:
 
@@ -205,6 +290,7 @@ def simplify(all_points, tilewidth, tileheight):
     but I haven't found that it is excessively bad.  certainly much better than
     making a list of rects, one for each tile on the map!
 
+    this is slow for large maps.  use simplify_mask if you can.
     """
 
     def pick_rect(points, rects):
@@ -240,9 +326,6 @@ def simplify(all_points, tilewidth, tileheight):
         kill = [ p for p in points if rect.collidepoint(p) ]
         [ points.remove(i) for i in kill ]
 
-        if points:
-            pick_rect(points, rects)
-
     rect_list = []
     while all_points:
         pick_rect(all_points, rect_list)
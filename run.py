@@ -1,6 +1,7 @@
 from lib2d.game import Game
 from lib2d import gfx
 import pygame
+import sys
 
 
 
@@ -14,5 +15,17 @@ class TestGame(Game):
 
 
 if __name__ == "__main__":
-    TestGame().start()
+    # python run.py --record FILE saves input for utilities/bench_level.py
+    recording = None
+    if len(sys.argv) == 3 and sys.argv[1] == "--record":
+        from lib2d.playerinput import InputRecording
+        import lib.levelstate
+        recording = InputRecording()
+        lib.levelstate.recording = recording
+
+    try:
+        TestGame().start()
+    finally:
+        if recording is not None:
+            recording.save(sys.argv[2])
     pygame.quit()
@@ -0,0 +1,95 @@
+"""
+Benchmark for running a level without a window.
+
+The world is built, a level is loaded into a LevelState and it is updated a
+fixed number of times with the headless driver.  Time spent in physics, the
+camera, input and drawing is reported, along with the peak memory used.
+
+Input can be replayed from a file made with "python run.py --record FILE".
+
+run from the root of the project:
+    python utilities/bench_level.py --ticks 2000
+"""
+
+import os, sys
+from optparse import OptionParser
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, root)
+os.chdir(root)
+
+from lib2d.headless import HeadlessDriver
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--guid", type="int", default=5001,
+                      help="guid of the level to load")
+    parser.add_option("--map", default=None,
+                      help="build the level from this tmx map instead")
+    parser.add_option("--ticks", type="int", default=2000,
+                      help="number of updates to run")
+    parser.add_option("--input", default=None,
+                      help="replay input recorded to this file")
+    parser.add_option("--draw-every", type="int", default=10,
+                      help="draw after this many updates, 0 for never")
+    parser.add_option("--batch", action="store_true", default=False,
+                      help="use the batched physics step")
+    parser.add_option("--chunk-size", type="int", default=0,
+                      help="draw the map from prerendered chunks this big")
+    parser.add_option("--prefetch", type="int", default=0,
+                      help="tiles of the map to draw ahead of the view")
+    parser.add_option("--blit-time", type="float", default=None,
+                      help="ms each update may spend blitting map tiles")
+    options, args = parser.parse_args()
+
+    # pygame has to be set up before the world can load images
+    driver = HeadlessDriver()
+
+    from lib2d.area import Area
+    from lib2d.tilemap import BufferedTilemapRenderer
+    from lib2d.playerinput import InputRecording
+    from lib.levelstate import LevelState
+    from lib import world
+
+    Area.batchPhysics = options.batch
+    if options.chunk_size:
+        size = options.chunk_size
+        BufferedTilemapRenderer.chunkSize = (size, size)
+    BufferedTilemapRenderer.prefetch = options.prefetch
+    if options.blit_time is not None:
+        BufferedTilemapRenderer.blitTime = options.blit_time / 1000.0
+
+    uni = world.build()
+    if options.map:
+        from lib2d.buildarea import fromTMX
+        level = fromTMX(uni, options.map)
+    else:
+        level = uni.getChildByGUID(options.guid)
+
+    recording = None
+    if options.input:
+        recording = InputRecording.load(options.input)
+
+    state = LevelState(level)
+    driver.start(state)
+
+    # break the update down into its parts
+    driver.timePhase(state.area, "update", "physics")
+    driver.timePhase(state.camera, "update", "camera")
+
+    report = driver.run(state, options.ticks, recording,
+                        draw_every=options.draw_every)
+    print report
+
+    stats = state.camera.maprender.getStats()
+    print
+    print "map tiles queued:  {}".format(stats["queued"])
+    print "map tiles blitted: {} ({:.1f} us each)".format(
+          stats["blits"], stats["avgBlit"] * 1000000)
+    print "map queue flushes: {} ({:.1f} ms)".format(
+          stats["flushes"], stats["flushTime"] * 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for pushing chains of bodies with Area.movePosition.
+
+A row of touching crates is placed on the floor and the first one is pushed
+into the rest.  The whole chain has to move together, so every push has to
+find and move every crate in the row.
+
+run from the root of the project:
+    python utilities/bench_push.py
+"""
+
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pygame import Rect
+from lib2d.area import Area
+from lib2d.objects import GameObject
+
+
+# number of crates in each chain tested
+chains = [10, 50, 100, 250, 500]
+
+# number of times the chain is pushed for each test
+pushes = 100
+
+crate_size = (4, 16, 16)
+
+
+class Crate(GameObject):
+    pushable = True
+
+
+def build_chain(length):
+    w = crate_size[1]
+    width = w * (length + pushes + 4)
+
+    area = Area()
+    area.setExtent(((0, 0), (width, 200)))
+    area.setLayerGeometry(0, [Rect(0, 180, width, 20)])
+
+    bodies = []
+    for i in xrange(length):
+        crate = Crate()
+        crate.size = crate_size
+        area.add(crate, (0, w + i * w, 100))
+        bodies.append(area.getBody(crate))
+
+    return area, bodies
+
+
+def run(length):
+    area, bodies = build_chain(length)
+    first, last = bodies[0], bodies[-1]
+    start = last.bbox.y
+
+    t = time.time()
+    for i in xrange(pushes):
+        if not area.movePosition(first, (0, 1, 0)):
+            raise Exception, "chain of {} could not be pushed".format(length)
+    elapsed = time.time() - t
+
+    if not last.bbox.y - start == pushes:
+        raise Exception, "chain of {} did not move together".format(length)
+
+    return elapsed
+
+
+def main():
+    print "{:>8} {:>12} {:>12}".format("crates", "ms/push", "us/crate")
+    for length in chains:
+        elapsed = run(length)
+        per_push = elapsed / pushes
+        print "{:>8} {:>12.3f} {:>12.2f}".format(
+            length, per_push * 1000, per_push / length * 1000000)
+
+
+if __name__ == "__main__":
+    main()
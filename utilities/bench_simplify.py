@@ -0,0 +1,91 @@
+"""
+Benchmark for merging tiles into rects with pytmx.utils.
+
+simplify_points (the old way) is compared to simplify_mask on the layers of
+the game's maps and on random maps of different sizes.  Both have to cover
+exactly the same tiles, without overlapping.
+
+run from the root of the project:
+    python utilities/bench_simplify.py
+"""
+
+import os, sys, time, random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy
+from pytmx import tmxloader
+from pytmx.utils import simplify_points, simplify_mask
+
+
+# maps and layers from the game
+maps = [("resources/maps/level1.tmx", "Control"),
+        ("resources/maps/level1.tmx", "Elevators")]
+
+# size of the random maps tested
+sizes = [16, 32, 64, 128]
+
+# chance that a tile in a random map is solid
+density = 0.7
+
+
+def covered(rects, shape):
+    """
+    return a mask of the tiles covered by rects, or None if they overlap
+    """
+
+    mask = numpy.zeros(shape, dtype=numpy.int32)
+    for rect in rects:
+        mask[rect.top:rect.bottom, rect.left:rect.right] += 1
+
+    if mask.max() > 1:
+        return None
+
+    return mask.astype(bool)
+
+
+def compare(name, mask):
+    points = [ (x, y) for (y, x) in zip(*numpy.nonzero(mask)) ]
+
+    t = time.time()
+    old = simplify_points(points, 1, 1)
+    old_time = time.time() - t
+
+    t = time.time()
+    new = simplify_mask(mask, 1, 1)
+    new_time = time.time() - t
+
+    for rects in (old, new):
+        if not numpy.array_equal(covered(rects, mask.shape), mask):
+            raise Exception, "rects do not match the tiles of {}".format(name)
+
+    print "{:<24} {:>8} {:>8} {:>10.1f} {:>8} {:>10.1f}".format(
+        name, mask.sum(), len(old), old_time * 1000, len(new), new_time * 1000)
+
+
+def main():
+    print "{:<24} {:>8} {:>8} {:>10} {:>8} {:>10}".format(
+        "map", "tiles", "old", "old ms", "new", "new ms")
+
+    for filename, layer in maps:
+        data = tmxloader.load_tmx(filename)
+        layer = data.getTileLayerByName(layer)
+        mask = numpy.array([ list(row) for row in layer.data ]) != 0
+        compare("{}:{}".format(os.path.basename(filename), layer.name), mask)
+
+    random.seed(0)
+    for size in sizes:
+        noise = numpy.array([ random.random() < density
+                              for i in xrange(size * size) ])
+        compare("random {0}x{0}".format(size), noise.reshape((size, size)))
+
+        # large solid blocks with some holes, more like a real map
+        rooms = numpy.ones((size, size), dtype=bool)
+        for i in xrange(size / 4):
+            x, y = random.randrange(size), random.randrange(size)
+            rooms[y:y + random.randint(2, 8), x:x + random.randint(2, 8)] = 0
+        compare("rooms {0}x{0}".format(size), rooms)
+
+
+if __name__ == "__main__":
+    main()